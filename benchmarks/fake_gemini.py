@@ -0,0 +1,128 @@
+"""
+Local stand-in for the Gemini REST API that injects faults and delays, for
+exercising the LLM transport (timeouts, retries, hedging, circuit breaker)
+without network access or quota.
+
+    python -m benchmarks.fake_gemini --port 8765 --error-rate 0.3 --slow-rate 0.05
+    GOOGLE_API_KEY=fake python main.py --llm-endpoint http://127.0.0.1:8765 --no-llm-cache
+
+Answers generateContent and streamGenerateContent with a fixed narrative that
+has every report section.
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from benchmarks.stub_narrative import STUB_NARRATIVE
+
+STATUS_TEXT = {200: 'OK', 404: 'Not Found', 429: 'Too Many Requests', 500: 'Internal Server Error',
+               503: 'Service Unavailable'}
+
+ERROR_REASONS = {429: 'RESOURCE_EXHAUSTED', 500: 'INTERNAL', 503: 'UNAVAILABLE'}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Gemini API with fault injection")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.2,
+                        help="Seconds before every response.")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Fraction of requests answered with an error status.")
+    parser.add_argument('--error-status', type=int, nargs='+', default=[429, 503], choices=sorted(ERROR_REASONS),
+                        help="Error statuses to choose from.")
+    parser.add_argument('--slow-rate', type=float, default=0.0,
+                        help="Fraction of requests delayed by --slow-delay instead (tail latency).")
+    parser.add_argument('--slow-delay', type=float, default=10.0)
+    parser.add_argument('--chunks', type=int, default=3,
+                        help="Chunks per streamed response.")
+    parser.add_argument('--seed', type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def response_chunk(text, final=False, prompt_chars=0):
+    chunk = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}]}
+    if final:
+        chunk["candidates"][0]["finishReason"] = 1  # STOP
+        chunk["usageMetadata"] = {"promptTokenCount": prompt_chars // 4,
+                                  "candidatesTokenCount": len(STUB_NARRATIVE) // 4,
+                                  "totalTokenCount": (prompt_chars + len(STUB_NARRATIVE)) // 4}
+    return chunk
+
+
+class FakeGemini:
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.requests = 0
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                method, target, _ = lines[0].split(' ', 2)
+                headers = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(':')
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', '0') or 0))
+                status, payload = await self.respond(method, target, body)
+                data = json.dumps(payload).encode('utf-8')
+                writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n"
+                             .encode('latin-1') + data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target, body):
+        self.requests += 1
+        path = target.split('?', 1)[0]
+        if method != 'POST' or not path.endswith((':generateContent', ':streamGenerateContent')):
+            return 404, {"error": {"code": 404, "message": f"Not found: {path}", "status": "NOT_FOUND"}}
+
+        roll = self.random.random()
+        if roll < self.args.error_rate:
+            status = self.random.choice(self.args.error_status)
+            await asyncio.sleep(self.args.delay)
+            print(f"#{self.requests} {path} -> {status}")
+            return status, {"error": {"code": status, "message": "Injected fault", "status": ERROR_REASONS[status]}}
+        slow = roll < self.args.error_rate + self.args.slow_rate
+        await asyncio.sleep(self.args.slow_delay if slow else self.args.delay)
+        print(f"#{self.requests} {path} -> 200{' (slow)' if slow else ''}")
+
+        prompt_chars = len(body)
+        if path.endswith(':generateContent'):
+            return 200, response_chunk(STUB_NARRATIVE, final=True, prompt_chars=prompt_chars)
+        # The REST streaming endpoint returns a JSON array of response chunks
+        size = -(-len(STUB_NARRATIVE) // self.args.chunks)
+        parts = [STUB_NARRATIVE[i:i + size] for i in range(0, len(STUB_NARRATIVE), size)]
+        return 200, [response_chunk(part, final=i == len(parts) - 1, prompt_chars=prompt_chars)
+                     for i, part in enumerate(parts)]
+
+
+async def serve(args):
+    fake = FakeGemini(args)
+    server = await asyncio.start_server(fake.handle_connection, args.host, args.port)
+    print(f"Fake Gemini API on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    try:
+        asyncio.run(serve(parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
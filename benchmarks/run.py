@@ -0,0 +1,204 @@
+"""
+Times the pipeline entry points on synthetic data and compares them with a
+saved baseline.
+
+    python -m benchmarks.run --rows 1e4 1e5 1e6 --save-baseline
+    python -m benchmarks.run --rows 1e4 1e5 1e6 --threshold 0.2
+
+Exits with status 1 when an entry point got slower than the baseline by more
+than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import plotly
+
+from benchmarks.stub_narrative import STUB_NARRATIVE
+from benchmarks.synthetic_data import write_sales_data
+from src.data_loader import DataLoader
+from src.aggregates import SalesAggregates
+from src.analyzer import BMWAnalyzer
+from src.visualizer import BMWVisualizer
+from src.llm_client import LLMClient
+from src.report_generator import ReportGenerator
+from src.evaluator import ReportEvaluator
+
+DATA_DIR = 'benchmarks/data'
+RESULTS_DIR = 'benchmarks/results'
+BASELINE_PATH = os.path.join(RESULTS_DIR, 'baseline.json')
+LATEST_PATH = os.path.join(RESULTS_DIR, 'latest.json')
+
+# Above this many rows the table is not loaded whole; only the streaming path runs
+MAX_IN_MEMORY_ROWS = 20000000
+
+# Differences below this are timer noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.005
+
+
+class StubResponse:
+    text = STUB_NARRATIVE
+    usage_metadata = None
+
+
+class StubModel:
+    """Answers instantly, so the benchmark measures only our side of the LLM step."""
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        return [StubResponse()] if stream else StubResponse()
+
+
+def parse_rows(value):
+    return int(float(value))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the BMW report pipeline on synthetic data")
+    parser.add_argument('--rows', type=parse_rows, nargs='+', default=[10**4, 10**5],
+                        help="Dataset sizes to benchmark, e.g. 1e4 1e6 1e8.")
+    parser.add_argument('--format', choices=['parquet', 'csv', 'xlsx'], default='parquet',
+                        help="File format of the generated datasets.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Runs per entry point; the fastest run is reported.")
+    parser.add_argument('--chunksize', type=int, default=1000000,
+                        help="Rows per chunk for the streaming entry point.")
+    parser.add_argument('--baseline', default=BASELINE_PATH,
+                        help="Baseline results to compare against (or to write with --save-baseline).")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Store this run as the new baseline instead of comparing.")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Relative slowdown reported as a regression (0.2 = 20%%).")
+    return parser.parse_args(argv)
+
+
+def dataset_path(rows, seed, file_format):
+    """Generates the dataset once and reuses it on later runs."""
+    path = os.path.join(DATA_DIR, f"sales_{rows}_seed{seed}.{file_format}")
+    if not os.path.exists(path):
+        print(f"Generating {rows} rows -> {path}")
+        write_sales_data(rows, path, seed)
+    return path
+
+
+def time_call(fn, repeat):
+    """Runs fn repeat times; returns (last result, timing dict in seconds)."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, {"min": min(times), "median": statistics.median(times), "runs": times}
+
+
+def benchmark_size(rows, args, work_dir):
+    """Times every entry point on one dataset size; returns {entry point: timing}."""
+    path = dataset_path(rows, args.seed, args.format)
+    results = {}
+
+    def run(name, fn):
+        result, timing = time_call(fn, args.repeat)
+        results[name] = timing
+        print(f"  {name:<34}{timing['min']:>10.4f} s")
+        return result
+
+    print(f"{rows} rows ({args.format}):")
+    aggregates = run('DataLoader.iter_chunks', lambda: SalesAggregates.from_chunks(
+        DataLoader(path, use_cache=False).iter_chunks(args.chunksize)))
+
+    if rows <= MAX_IN_MEMORY_ROWS:
+        df = run('DataLoader.load_data', lambda: DataLoader(path, use_cache=False).load_data())
+        aggregates = run('SalesAggregates', lambda: SalesAggregates(df))
+        run('BMWAnalyzer.get_summary_stats', lambda: BMWAnalyzer(df).get_summary_stats())
+        del df
+
+    summary_stats = BMWAnalyzer(aggregates).get_summary_stats()
+    plot_htmls = run('BMWVisualizer.generate_all_plots',
+                     lambda: BMWVisualizer(aggregates).generate_all_plots())
+    run('BMWVisualizer.compact', lambda: BMWVisualizer(aggregates, compact=True).generate_all_plots())
+
+    llm = LLMClient(model=StubModel())
+    narrative = run('LLMClient (stub model)', lambda: llm.generate_report_content(summary_stats))
+
+    generator = ReportGenerator(work_dir)
+    report_path = run('ReportGenerator', lambda: generator.generate_interactive_report(narrative, plot_htmls))
+    run('ReportEvaluator', lambda: ReportEvaluator(report_path).evaluate())
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "plotly": plotly.__version__
+    }
+
+
+def compare(results, baseline, threshold):
+    """Returns a list of (size, entry point, baseline s, current s) that slowed down past threshold."""
+    regressions = []
+    for size, entries in results.items():
+        for name, timing in entries.items():
+            previous = baseline.get(size, {}).get(name)
+            if previous is None:
+                continue
+            before, after = previous["min"], timing["min"]
+            if after > before * (1 + threshold) and after - before > MIN_REGRESSION_SECONDS:
+                regressions.append((size, name, before, after))
+    return regressions
+
+
+def save_results(path, results):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in args.rows:
+            results[str(rows)] = benchmark_size(rows, args, work_dir)
+
+    save_results(LATEST_PATH, results)
+    if args.save_baseline:
+        save_results(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline["environment"] != environment():
+        print("Warning: baseline was recorded in a different environment; comparisons may not be meaningful.")
+
+    regressions = compare(results, baseline["results"], args.threshold)
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}.")
+        return 0
+
+    print(f"Regressions beyond {args.threshold:.0%}:")
+    for size, name, before, after in regressions:
+        print(f"  {size} rows, {name}: {before:.4f} s -> {after:.4f} s ({after / before - 1:+.0%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+"""
+Fixed narrative with every report section, answered by the benchmark's stub
+model and by the fake Gemini server. Kept free of heavy imports so the fake
+server starts without loading pandas, plotly or src.
+"""
+
+STUB_NARRATIVE = """## Executive Summary
+
+Synthetic benchmark narrative.
+
+## Sales Trends
+
+Yearly sales.
+
+## Regional & Model Performance
+
+Regions and models.
+
+## Mobility Trends (Fuel & Transmission)
+
+Fuel and transmission.
+
+## Key Drivers of Sales
+
+Price and color.
+
+## Strategic Recommendations
+
+Recommendations.
+"""
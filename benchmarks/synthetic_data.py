@@ -0,0 +1,103 @@
+"""
+Seeded synthetic sales data with the same schema (columns, categories, value
+ranges) as the BMW workbook, for benchmarks at any size.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+MODELS = ['3 Series', '5 Series', '7 Series', 'M3', 'M5', 'X1', 'X3', 'X5', 'X6', 'i3', 'i8']
+REGIONS = ['Africa', 'Asia', 'Europe', 'Middle East', 'North America', 'South America']
+COLORS = ['Black', 'Blue', 'Grey', 'Red', 'Silver', 'White']
+FUEL_TYPES = ['Diesel', 'Electric', 'Hybrid', 'Petrol']
+TRANSMISSIONS = ['Automatic', 'Manual']
+YEARS = (2020, 2024)
+
+COLUMNS = ['Model', 'Year', 'Region', 'Color', 'Fuel_Type', 'Transmission',
+           'Engine_Size_L', 'Mileage_KM', 'Price_USD', 'Sales_Volume']
+
+# Rows generated per block. Block i always uses the seed (seed, i), so a
+# dataset depends only on (rows, seed), however it is written out.
+BLOCK_ROWS = 1000000
+
+# Excel sheets hold at most 2**20 rows including the header
+EXCEL_MAX_ROWS = 2**20 - 1
+
+
+def _categorical(rng, categories, size):
+    codes = rng.integers(0, len(categories), size=size, dtype=np.int8)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def _generate_block(rows, seed, block_index):
+    rng = np.random.default_rng([seed, block_index])
+    return pd.DataFrame({
+        'Model': _categorical(rng, MODELS, rows),
+        'Year': rng.integers(YEARS[0], YEARS[1] + 1, size=rows),
+        'Region': _categorical(rng, REGIONS, rows),
+        'Color': _categorical(rng, COLORS, rows),
+        'Fuel_Type': _categorical(rng, FUEL_TYPES, rows),
+        'Transmission': _categorical(rng, TRANSMISSIONS, rows),
+        # 1.5 to 5.0 litres in steps of 0.1, like the workbook
+        'Engine_Size_L': rng.integers(15, 51, size=rows) / 10,
+        'Mileage_KM': rng.integers(0, 200000, size=rows),
+        'Price_USD': rng.integers(30000, 120000, size=rows),
+        'Sales_Volume': rng.integers(100, 10000, size=rows)
+    }, columns=COLUMNS)
+
+
+def iter_sales_data(rows, seed=0):
+    """Yields the dataset as DataFrames of at most BLOCK_ROWS rows."""
+    for block_index, start in enumerate(range(0, rows, BLOCK_ROWS)):
+        yield _generate_block(min(BLOCK_ROWS, rows - start), seed, block_index)
+
+
+def generate_sales_data(rows, seed=0):
+    """Returns the whole dataset as one DataFrame (use write_sales_data for large sizes)."""
+    return pd.concat(iter_sales_data(rows, seed), ignore_index=True)
+
+
+def write_sales_data(rows, path, seed=0):
+    """
+    Writes the dataset to path (.csv, .parquet or .xlsx) one block at a time,
+    so sizes far beyond memory (10^8 rows) can be generated.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    extension = os.path.splitext(path)[1].lower()
+    tmp_path = path + '.tmp'
+    if extension == '.csv':
+        for i, block in enumerate(iter_sales_data(rows, seed)):
+            block.to_csv(tmp_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    elif extension in ('.parquet', '.pq'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for block in iter_sales_data(rows, seed):
+                table = pa.Table.from_pandas(block, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    elif extension in ('.xlsx', '.xlsm'):
+        if rows > EXCEL_MAX_ROWS:
+            raise ValueError(f"Excel sheets hold at most {EXCEL_MAX_ROWS} data rows, got {rows}")
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(COLUMNS)
+        for block in iter_sales_data(rows, seed):
+            for row in block.astype(object).itertuples(index=False, name=None):
+                sheet.append(row)
+        workbook.save(tmp_path)
+    else:
+        raise ValueError(f"Unsupported output format: {extension}")
+
+    # Only complete files get the final name, so an interrupted run is regenerated
+    os.replace(tmp_path, path)
+    return path
@@ -1,58 +1,363 @@
+import argparse
+import asyncio
+import json
 import os
 import sys
-from src.data_loader import DataLoader
-from src.analyzer import BMWAnalyzer
-from src.visualizer import BMWVisualizer
-from src.llm_client import LLMClient
-from src.report_generator import ReportGenerator
+# Only lightweight modules here; pandas, plotly, markdown and google.generativeai
+# are imported by the stage that needs them, so quick commands start fast
+from src.cache import DiskCache
 from src.evaluator import ReportEvaluator
+from src.profiler import PipelineProfiler
+from src.batch import SLICE_DIMENSIONS
+from src.catalog import parse_filter
+
+LLM_CACHE_DIR = '.cache/llm'
+LLM_CACHE_TTL = 7 * 24 * 3600 # seconds
+NARRATIVE_FAILED = "## AI Generation Failed"
+FIGURE_CACHE_DIR = '.cache/figures'
+FIGURE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+DATA_PATH = 'data/BMW sales data (2020-2024).xlsx'
+
+EVALUATION_SUMMARY = 'evaluation.json'
+
+PROFILE_STAGES = ['load', 'analyze', 'plots', 'report', 'evaluate', 'batch']
+
+PLOTS_DIR = 'output/plots'
+
+def add_data_options(parser):
+    parser.add_argument('--data', default=DATA_PATH,
+                        help="Sales data file (.xlsx, .csv or .parquet) or a directory of Year/Region-"
+                             "partitioned Parquet or CSV files (see the convert command).")
+    parser.add_argument('--filter', dest='filters', type=parse_filter, action='append', metavar='CONDITION',
+                        help="Only use rows matching CONDITION, e.g. 'Year>=2023', 'Region==Asia' or "
+                             "'Model in X5,X6' (repeatable). Partitioned datasets and Parquet files "
+                             "skip non-matching partitions and row groups while reading.")
+    parser.add_argument('--stream', action='store_true', default=False,
+                        help="Aggregate the data file in chunks instead of loading it whole "
+                             "(for extracts larger than memory).")
+    parser.add_argument('--chunksize', type=int, default=100000,
+                        help="Rows per chunk in --stream mode.")
+    return parser
+
+def positive_int(text):
+    """argparse type for counts that must be at least 1."""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return value
+
+def max_points(text):
+    """argparse type for --max-points: 1 up to the row sample kept by SalesAggregates."""
+    from src.aggregates import POINT_SAMPLE_SIZE
+
+    value = int(text)
+    if not 1 <= value <= POINT_SAMPLE_SIZE:
+        raise argparse.ArgumentTypeError(f"must be between 1 and {POINT_SAMPLE_SIZE}")
+    return value
+
+def add_subcommands(parser):
+    """
+    Quick jobs that skip the rest of the pipeline (and its imports). Options
+    are given after the command, e.g. `main.py stats --data sales.csv`.
+    """
+    # SUPPRESS keeps the main parser's defaults unless an option is given after the command
+    data_options = add_data_options(argparse.ArgumentParser(add_help=False, argument_default=argparse.SUPPRESS))
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND',
+                                     help="Run a single stage instead of the full report (optional).")
+
+    stats = commands.add_parser('stats', parents=[data_options],
+                                help="Print the summary statistics as JSON (no plotting, no LLM).")
+    stats.add_argument('--output', metavar='JSON_PATH',
+                       help="Write the statistics to JSON_PATH instead of printing them.")
+
+    plots = commands.add_parser('plots', parents=[data_options],
+                                help="Render every chart to its own file (no LLM, no report).")
+    plots.add_argument('--output-dir', default=PLOTS_DIR,
+                       help="Directory for the chart files.")
+    plots.add_argument('--compact', action='store_true', default=argparse.SUPPRESS,
+                       help="Write compact Plotly figure JSON instead of HTML pages.")
+    plots.add_argument('--offline', action='store_true', default=argparse.SUPPRESS,
+                       help="Inline plotly.js in each HTML page.")
+    plots.add_argument('--max-points', type=max_points, default=argparse.SUPPRESS,
+                       help="Most points per scatter plot (see the main --max-points).")
+    plots.add_argument('--no-figure-cache', action='store_true', default=argparse.SUPPRESS,
+                       help="Render every chart instead of reusing cached ones.")
+    plots.add_argument('--plot-workers', type=positive_int, default=argparse.SUPPRESS,
+                       help="Workers rendering the charts in parallel (see the main --plot-workers).")
+    plots.add_argument('--plot-processes', action='store_true', default=argparse.SUPPRESS,
+                       help="Render the charts on worker processes instead of threads.")
+
+    convert = commands.add_parser('convert', parents=[data_options],
+                                  help="Convert the data file into a Year/Region-partitioned dataset directory.")
+    convert.add_argument('output', metavar='DIRECTORY',
+                         help="Dataset directory to create, e.g. data/sales (pass it as --data afterwards).")
+    convert.add_argument('--format', choices=['parquet', 'csv'], default='parquet',
+                         help="File format of the partition files.")
+    convert.add_argument('--overwrite', action='store_true',
+                         help="Replace DIRECTORY if it already exists.")
+
+    evaluate = commands.add_parser('evaluate',
+                                   help="Evaluate existing reports only (no data loading).")
+    evaluate.add_argument('paths', nargs='*', default=['output/Interactive_Report.html'], metavar='PATH',
+                          help="Report files (.html, .html.gz) or directories of reports; a directory "
+                               "gets an evaluation.json summary.")
+    evaluate.add_argument('--eval-workers', type=int, default=argparse.SUPPRESS,
+                          help="Worker processes used to evaluate reports (default: one per CPU).")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="BMW Sales Report Generation Workflow")
+    add_data_options(parser)
+    parser.add_argument('--incremental', metavar='STATE_PATH',
+                        help="Persist the aggregates to STATE_PATH and, on later runs, only "
+                             "aggregate rows appended to the data since then.")
+    parser.add_argument('--verify-incremental', action='store_true',
+                        help="Check incremental aggregates against a full recompute.")
+    parser.add_argument('--cube', metavar='CUBE_PATH',
+                        help="Also save a pre-aggregated cube of all dimensions to CUBE_PATH (.npz) "
+                             "for ad-hoc rollup/slice/top-N queries (see src/cube.py).")
+    parser.add_argument('--no-llm-cache', action='store_true',
+                        help="Always call the LLM and do not store the response.")
+    parser.add_argument('--refresh-llm-cache', action='store_true',
+                        help="Call the LLM even on a cache hit and overwrite the cached response.")
+    parser.add_argument('--llm-sections', action='store_true',
+                        help="Request each report section with its own compact prompt, all concurrently, "
+                             "instead of the whole narrative in one completion.")
+    parser.add_argument('--llm-timeout', type=float, default=60,
+                        help="Seconds before an LLM request is abandoned and retried.")
+    parser.add_argument('--llm-deadline', type=float, default=180,
+                        help="Seconds per narrative (or section) LLM call, retries included; then the "
+                             "cached or template narrative is used.")
+    parser.add_argument('--llm-retries', type=int, default=3,
+                        help="Retries (with jittered exponential backoff) after timeouts, 429 and 5xx errors.")
+    parser.add_argument('--llm-hedge', action='store_true',
+                        help="Send a duplicate LLM request when one runs past the p95 latency of recent "
+                             "requests, and use whichever answers first (useful for large batch runs).")
+    parser.add_argument('--llm-endpoint', default=None,
+                        help="Send LLM requests over REST to this host instead of the Gemini API "
+                             "(e.g. http://127.0.0.1:8765 for benchmarks/fake_gemini.py).")
+    parser.add_argument('--compact', action='store_true',
+                        help="Embed all figure data once as minified JSON with reduced float precision "
+                             "and typed arrays, instead of one Plotly HTML blob per chart.")
+    parser.add_argument('--max-points', type=max_points, default=2000,
+                        help="Scatter plots draw every row up to this many rows; above it they show a "
+                             "density heatmap of all rows with a sample of this many points on top "
+                             "(at most 20000, the rows the aggregates keep for these plots).")
+    parser.add_argument('--no-figure-cache', action='store_true',
+                        help="Render every chart instead of reusing the charts of earlier runs whose "
+                             f"data and options are unchanged (cached in {FIGURE_CACHE_DIR}).")
+    parser.add_argument('--plot-workers', type=positive_int, default=1,
+                        help="Workers rendering the charts of a report in parallel (pays off for large "
+                             "datasets; 1 renders serially). In batch mode this applies per slice.")
+    parser.add_argument('--plot-processes', action='store_true',
+                        help="Render the charts on --plot-workers processes instead of threads.")
+    parser.add_argument('--gzip', action='store_true',
+                        help="Also write a precompressed .html.gz copy of every report.")
+    parser.add_argument('--offline', action='store_true',
+                        help="Inline the pinned plotly.js so reports open without network access.")
+    parser.add_argument('--batch', nargs='+', choices=sorted(SLICE_DIMENSIONS), metavar='DIMENSION',
+                        help="Generate one report per slice of each dimension (region, year, model) "
+                             "plus an index page in output/batch, instead of the global report.")
+    parser.add_argument('--batch-workers', type=positive_int, default=4,
+                        help="Worker threads used to analyze and render slices in batch mode.")
+    parser.add_argument('--llm-concurrency', type=positive_int, default=4,
+                        help="Maximum LLM requests in flight in batch mode (retries, hedges and "
+                             "the sections of --llm-sections each count).")
+    parser.add_argument('--llm-rpm', type=int, default=60,
+                        help="Maximum LLM requests started per minute in batch mode.")
+    parser.add_argument('--eval-workers', type=int, default=None,
+                        help="Worker processes used to evaluate reports (default: one per CPU).")
+    parser.add_argument('--serve', action='store_true',
+                        help="Run a local HTTP service that keeps the data, stats, plots and report "
+                             "warm in memory (endpoints /stats, /plots/<key>, /report).")
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="Address the --serve service listens on.")
+    parser.add_argument('--port', type=int, default=8000,
+                        help="Port the --serve service listens on.")
+    parser.add_argument('--profile', metavar='TRACE_PATH',
+                        help="Record wall/CPU time, memory and sizes per stage, per plot and per LLM call, "
+                             "write them to TRACE_PATH and print a summary.")
+    parser.add_argument('--profile-format', choices=['json', 'chrome'], default='json',
+                        help="Trace format: plain JSON, or Chrome trace for chrome://tracing / Perfetto.")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Also record the tracemalloc peak of each stage (slows the run).")
+    parser.add_argument('--cprofile', nargs='+', choices=PROFILE_STAGES, default=[], metavar='STAGE',
+                        help="Dump cProfile stats of the given stages to output/profile/{stage}.prof.")
+    add_subcommands(parser)
+    args = parser.parse_args(argv)
+    if args.stream and (args.batch or args.incremental):
+        parser.error("--batch and --incremental need the full table and cannot be combined with --stream")
+    if args.serve and (args.stream or args.batch):
+        parser.error("--serve keeps the full table in memory and cannot be combined with --stream or --batch")
+    if args.batch and args.incremental:
+        parser.error("--batch aggregates each slice from scratch and cannot be combined with --incremental")
+    if args.serve and (args.incremental or args.cube or args.profile or args.trace_memory or args.cprofile):
+        parser.error("--serve does not run the report pipeline and cannot be combined with --incremental, "
+                     "--cube, --profile, --trace-memory or --cprofile")
+    return args
+
+def report_options(args):
+    """ReportGenerator keyword arguments selected on the command line."""
+    return {
+        "plotlyjs": 'inline' if args.offline else 'cdn',
+        "gzip_output": args.gzip
+    }
+
+def plot_options(args):
+    """BMWVisualizer keyword arguments selected on the command line."""
+    cache = None
+    if not args.no_figure_cache:
+        cache = DiskCache(FIGURE_CACHE_DIR, max_bytes=FIGURE_CACHE_MAX_BYTES, max_entries=5000)
+    return {
+        "compact": args.compact,
+        "max_points": args.max_points,
+        "cache": cache
+    }
+
+def render_options(args):
+    """BMWVisualizer.generate_all_plots keyword arguments selected on the command line."""
+    return {
+        "workers": args.plot_workers,
+        "use_processes": args.plot_processes
+    }
+
+def create_llm_client(args):
+    """Returns an LLMClient, or None when no API key is configured."""
+    from src.llm_client import LLMClient
+    from src.llm_transport import ResilientTransport
+
+    llm_cache = None if args.no_llm_cache else DiskCache(LLM_CACHE_DIR, ttl=LLM_CACHE_TTL)
+    transport = ResilientTransport(timeout=args.llm_timeout, deadline=args.llm_deadline,
+                                   max_retries=args.llm_retries, hedge=args.llm_hedge)
+    try:
+        return LLMClient(cache=llm_cache, refresh_cache=args.refresh_llm_cache, sectioned=args.llm_sections,
+                         transport=transport, api_endpoint=args.llm_endpoint)
+    except ValueError as ve:
+        print(f"Warning: {ve}")
+        return None
+
+async def generate_narrative(llm, summary_stats, verbose=True):
+    """Streams the AI narrative, reporting when the first chunk arrives."""
+    if llm is None:
+        return "## AI Generation Skipped\n\nNo API Key provided. Please check .env file."
+
+    received = []
+    def on_token(text):
+        if verbose and not received:
+            print("Receiving AI narrative...")
+        received.append(len(text))
+
+    try:
+        narrative = await llm.generate_report_content_async(summary_stats, on_token=on_token)
+        if verbose:
+            print(f"AI Narrative generated ({sum(received)} characters streamed).")
+        return narrative
+    except Exception as e:
+        print(f"Warning: AI generation failed: {e}")
+        return f"{NARRATIVE_FAILED}\n\nError: {e}"
+
+async def generate_plots_and_narrative(render_plots, llm, summary_stats):
+    """
+    Starts the LLM request and renders the plots while it is in flight,
+    so the slower of the two sets the pace instead of their sum.
+    """
+    narrative_task = asyncio.ensure_future(generate_narrative(llm, summary_stats))
+    loop = asyncio.get_running_loop()
+    plot_htmls = await loop.run_in_executor(None, render_plots)
+    print("Interactive plots generated.")
+    narrative = await narrative_task
+    return plot_htmls, narrative
+
+def main(argv=None):
+    args = parse_args(argv)
+    commands = {'stats': run_stats, 'plots': run_plots, 'evaluate': run_evaluate, 'convert': run_convert}
+    if args.command:
+        commands[args.command](args)
+        return
+    if args.serve:
+        serve(args)
+        return
+
+    from src.data_loader import DataLoader
+    from src.aggregates import SalesAggregates
+    from src.analyzer import BMWAnalyzer
+    from src.visualizer import BMWVisualizer
+    from src.report_generator import ReportGenerator
 
-def main():
     print("Starting BMW Sales Report Generation Workflow...")
+    profiler = PipelineProfiler(trace_memory=args.trace_memory, cprofile_stages=args.cprofile)
 
-    # Configuration
-    DATA_PATH = 'data/BMW sales data (2020-2024).xlsx'
-    
     # 1. Load Data
     print("Loading data...")
     try:
-        loader = DataLoader(DATA_PATH)
-        df = loader.load_data()
-        print(f"Data loaded successfully. Shape: {df.shape}")
+        with profiler.stage('load', input_bytes=input_bytes(args.data)) as stage:
+            loader = DataLoader(args.data, filters=args.filters)
+            if args.stream:
+                # Aggregate chunk by chunk; the full table is never held in memory
+                print(f"Streaming data in chunks of {args.chunksize} rows...")
+                chunks = loader.iter_chunks(args.chunksize)
+                if args.cube:
+                    cubes = []
+                    chunks = fold_into_cube(chunks, cubes)
+                aggregates = SalesAggregates.from_chunks(chunks)
+                stage['rows'] = aggregates.row_count
+                print(f"Data streamed successfully. Rows: {aggregates.row_count}")
+            else:
+                df = loader.load_data()
+                stage['rows'] = len(df)
+                stage['memory_bytes'] = int(df.memory_usage(deep=True).sum())
+                print(f"Data loaded successfully. Shape: {df.shape}")
     except Exception as e:
         print(f"Failed to load data: {e}")
         sys.exit(1)
 
+    if args.batch:
+        if args.cube:
+            from src.cube import SalesCube
+            save_cube(args.cube, SalesCube(df))
+        run_batch(df, args, profiler)
+        return
+
     # 2. Analyze Data
     print("Analyzing data...")
-    analyzer = BMWAnalyzer(df)
-    summary_stats = analyzer.get_summary_stats()
+    with profiler.stage('analyze') as stage:
+        if args.incremental:
+            analyzer = BMWAnalyzer.from_state(df, args.incremental, verify=args.verify_incremental)
+            aggregates = analyzer.aggregates
+        else:
+            if not args.stream:
+                # Aggregate once; analysis and plotting both read from the same store
+                aggregates = SalesAggregates(df)
+            analyzer = BMWAnalyzer(aggregates)
+        summary_stats = analyzer.get_summary_stats()
+        stage['rows'] = aggregates.row_count
+        stage['stats_chars'] = len(json.dumps(summary_stats, default=str))
+        if args.cube:
+            from src.cube import SalesCube
+            stage['cube_cells'] = save_cube(args.cube, cubes[0] if args.stream else SalesCube(df))
     print("Summary stats calculated.")
 
-    # 3. Generate Visualizations
-    print("Generating visualizations...")
-    visualizer = BMWVisualizer(df)
-    # This now returns a dictionary of HTML strings
-    plot_htmls = visualizer.generate_all_plots()
-    print("Interactive plots generated.")
+    # 3 & 4. Generate Visualizations and AI Narrative concurrently
+    print("Generating visualizations and AI narrative...")
+    visualizer = BMWVisualizer(aggregates, **plot_options(args))
 
-    # 4. Generate AI Narrative
-    print("Generating AI narrative...")
-    try:
-        llm = LLMClient()
-        narrative = llm.generate_report_content(summary_stats)
-        print("AI Narrative generated.")
-    except ValueError as ve:
-        print(f"Warning: {ve}")
-        narrative = "## AI Generation Skipped\n\nNo API Key provided. Please check .env file."
-    except Exception as e:
-        print(f"Warning: AI generation failed: {e}")
-        narrative = f"## AI Generation Failed\n\nError: {e}"
+    def render_plots():
+        # Runs on the executor thread, so that is the thread cProfile sees
+        with profiler.stage('plots', workers=args.plot_workers) as stage:
+            plots = visualizer.generate_all_plots(**render_options(args))
+            stage['plot_count'] = len(plots)
+            stage['output_chars'] = sum(len(plot) for plot in plots.values() if isinstance(plot, str))
+        return plots
+
+    llm = create_llm_client(args)
+    plot_htmls, narrative = asyncio.run(generate_plots_and_narrative(render_plots, llm, summary_stats))
 
     # 5. Compile Report
     print("Compiling final interactive report...")
-    generator = ReportGenerator()
-    report_path = generator.generate_interactive_report(narrative, plot_htmls)
+    with profiler.stage('report', narrative_chars=len(narrative)) as stage:
+        generator = ReportGenerator(**report_options(args))
+        report_path = generator.generate_interactive_report(narrative, plot_htmls)
+        stage['output_bytes'] = os.path.getsize(report_path)
     
     print("="*50)
     print(f"SUCCESS! Interactive Report generated at: {report_path}")
@@ -60,8 +365,188 @@ def main():
 
     # 6. Evaluate Report
     print("Evaluating report quality...")
-    evaluator = ReportEvaluator(report_path)
-    evaluator.print_report()
+    with profiler.stage('evaluate'):
+        evaluator = ReportEvaluator(report_path)
+        evaluator.print_report()
+
+    profiler.add_plot_timings(visualizer.plot_timings)
+    save_profile(profiler, args, llm)
+
+def save_cube(path, cube):
+    cube.save(path)
+    print(f"Sales cube ({cube.cell_count} cells) saved to: {path}")
+    return cube.cell_count
+
+def fold_into_cube(chunks, cubes):
+    """Passes the chunks through, folding each into cubes[0] so --stream reads the file once."""
+    from src.cube import SalesCube
+
+    for chunk in chunks:
+        partial = SalesCube(chunk)
+        if cubes:
+            cubes[0].merge(partial)
+        else:
+            cubes.append(partial)
+        yield chunk
+
+def save_profile(profiler, args, llm):
+    """Writes the trace and prints the stage summary when --profile is given."""
+    if not args.profile:
+        return
+    if llm is not None:
+        profiler.add_llm_calls(llm.calls)
+    trace_path = profiler.save(args.profile, trace_format=args.profile_format)
+    profiler.print_summary()
+    print(f"Profile written to: {trace_path}")
+
+def run_batch(df, args, profiler):
+    """Generates one report per slice, sharing one LLM client across all slices."""
+    from src.batch import BatchReportRunner
+
+    print(f"Generating batch reports by {', '.join(args.batch)}...")
+    llm = create_llm_client(args)
+
+    async def narrate(summary_stats):
+        return await generate_narrative(llm, summary_stats, verbose=False)
+
+    runner = BatchReportRunner(df, narrate,
+                               plot_options=plot_options(args),
+                               render_options=render_options(args),
+                               report_options=report_options(args),
+                               workers=args.batch_workers,
+                               max_concurrency=args.llm_concurrency,
+                               rate_per_minute=args.llm_rpm,
+                               transport=llm.transport if llm is not None else None)
+    with profiler.stage('batch', dimensions=args.batch) as stage:
+        index_path = runner.run(args.batch)
+        stage['report_count'] = len(runner.report_paths)
+        if llm is not None:
+            stage['llm_transport'] = dict(llm.transport.stats)
+            fallbacks = sum(1 for call in llm.calls if call['fallback'])
+            print(f"LLM requests: {llm.transport.stats['attempts']} sent, {llm.transport.stats['retries']} retried, "
+                  f"{llm.transport.stats['hedges']} hedged, {fallbacks} fell back to cached/template text.")
+
+    print("="*50)
+    print(f"SUCCESS! Batch report index generated at: {index_path}")
+    print("="*50)
+
+    print("Evaluating batch reports...")
+    summary_path = os.path.join(runner.output_dir, EVALUATION_SUMMARY)
+    with profiler.stage('evaluate', report_count=len(runner.report_paths)):
+        summary = ReportEvaluator.evaluate_many(runner.report_paths, workers=args.eval_workers, summary_path=summary_path)
+    print_evaluation_summary(summary, summary_path)
+
+    save_profile(profiler, args, llm)
+
+def serve(args):
+    """Runs the warm-state HTTP service until interrupted."""
+    from src.server import ReportServer, ReportService
+
+    llm = create_llm_client(args)
+
+    async def narrate(summary_stats):
+        calls = len(llm.calls) if llm is not None else 0
+        narrative = await generate_narrative(llm, summary_stats, verbose=False)
+        # Template or expired-cache text, or a failed call: the service asks the LLM again later
+        fallback = llm is not None and (narrative.startswith(NARRATIVE_FAILED)
+                                        or any(call['fallback'] for call in llm.calls[calls:]))
+        return narrative, fallback
+
+    service = ReportService(args.data, narrate, compact=args.compact, report_options=report_options(args),
+                            max_points=args.max_points, filters=args.filters)
+    server = ReportServer(service, host=args.host, port=args.port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("Server stopped.")
+
+def input_bytes(path):
+    """Size of the data file, or of all files in a dataset directory."""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def load_aggregates(args):
+    """Loads (or streams) the data file into SalesAggregates for the quick commands."""
+    from src.data_loader import DataLoader
+    from src.aggregates import SalesAggregates
+
+    try:
+        loader = DataLoader(args.data, filters=args.filters)
+        if args.stream:
+            return SalesAggregates.from_chunks(loader.iter_chunks(args.chunksize))
+        return SalesAggregates(loader.load_data())
+    except Exception as e:
+        print(f"Failed to load data: {e}", file=sys.stderr)
+        sys.exit(1)
+
+def run_stats(args):
+    """`stats` command: summary statistics only; neither plotly nor the LLM client is imported."""
+    from src.analyzer import BMWAnalyzer
+
+    summary_stats = BMWAnalyzer(load_aggregates(args)).get_summary_stats()
+    text = json.dumps(summary_stats, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"Summary statistics written to: {args.output}")
+    else:
+        print(text)
+
+def run_plots(args):
+    """`plots` command: renders every chart to its own file in args.output_dir."""
+    from src.visualizer import BMWVisualizer
+    from src.report_generator import ReportGenerator
+
+    visualizer = BMWVisualizer(load_aggregates(args), **plot_options(args))
+    plots = visualizer.generate_all_plots(**render_options(args))
+    generator = ReportGenerator(args.output_dir, **report_options(args))
+    for key, plot in plots.items():
+        if args.compact:
+            path = os.path.join(args.output_dir, f"{key}.json")
+            content = json.dumps(plot, separators=(',', ':'))
+        else:
+            path = os.path.join(args.output_dir, f"{key}.html")
+            content = generator.render_plot_page(key, plot)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+    print(f"{len(plots)} charts written to: {args.output_dir}")
+
+def run_evaluate(args):
+    """`evaluate` command: scores existing reports; directories are evaluated in parallel."""
+    for path in args.paths:
+        if os.path.isdir(path):
+            evaluate_reports(path, args)
+        else:
+            print(f"Report: {path}")
+            ReportEvaluator(path).print_report()
+
+def run_convert(args):
+    """`convert` command: writes the data file as a Year/Region-partitioned dataset, chunk by chunk."""
+    from src.data_loader import DataLoader, DATASET_DTYPES
+    from src.catalog import write_partitioned, PARTITION_COLUMNS
+
+    chunks = DataLoader(args.data, filters=args.filters).iter_chunks(args.chunksize)
+    try:
+        rows = write_partitioned(chunks, args.output, args.format, overwrite=args.overwrite,
+                                 dtypes=DATASET_DTYPES)
+    except (OSError, ValueError) as e:
+        print(f"Conversion failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{rows} rows written to {args.output} ({args.format}, partitioned by {', '.join(PARTITION_COLUMNS)}).")
+
+def evaluate_reports(directory, args):
+    """Evaluates every report in directory and writes the JSON summary next to them."""
+    summary_path = os.path.join(directory, EVALUATION_SUMMARY)
+    summary = ReportEvaluator.evaluate_directory(directory, workers=args.eval_workers, summary_path=summary_path)
+    print_evaluation_summary(summary, summary_path)
+
+def print_evaluation_summary(summary, summary_path):
+    print(f"Evaluated {summary['report_count']} reports, mean score {summary['mean_score']}, "
+          f"min score {summary['min_score']}.")
+    for path in summary["below_full_score"]:
+        print(f"  Below full score: {path} ({summary['reports'][path]['score']}/100)")
+    print(f"Evaluation summary written to: {summary_path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,599 @@
+import hashlib
+import json
+import re
+import numpy as np
+import pandas as pd
+
+# Dimensions rolled up by SalesAggregates
+DIMENSIONS = ['Year', 'Region', 'Model', 'Fuel_Type', 'Transmission', 'Color', 'Price_Segment']
+
+# Two-way rollups (index, columns) used by the report
+CROSS_TABS = [('Year', 'Fuel_Type'), ('Price_Segment', 'Fuel_Type')]
+
+NUMERIC_COLUMNS = ['Engine_Size_L', 'Mileage_KM', 'Price_USD', 'Sales_Volume']
+
+# Row-level plots. Every chunk bins its rows onto the same grids (fixed widths
+# anchored at 0), so the sparse bin counts merge exactly across chunks.
+POINT_BIN_WIDTHS = {'Price_USD': 1000, 'Sales_Volume': 100, 'Mileage_KM': 2000}
+
+# (x, y) grids of row counts; a dimension axis bins by its category code
+POINT_GRIDS = [('Price_USD', 'Sales_Volume'), ('Mileage_KM', 'Price_USD'), ('Fuel_Type', 'Price_USD')]
+
+# Part of saved states; bump when the row sample or grids change
+POINTS_VERSION = 2
+
+# Grids spanning at most this many cells are counted densely (no sort)
+DENSE_GRID_CELLS = 1 << 22
+
+# Rows kept for scatter plots: the ones with the smallest row hashes, which is a
+# uniform sample that does not depend on how the data was chunked or ordered
+POINT_SAMPLE_SIZE = 20000
+
+PRICE_BINS = [0, 40000, 70000, 100000, float('inf')]
+PRICE_LABELS = ['Budget (<40k)', 'Mid-Range (40k-70k)', 'Premium (70k-100k)', 'Luxury (>100k)']
+
+
+def price_segment_codes(prices):
+    """
+    Maps prices to an index into PRICE_LABELS, or -1 when outside every bin.
+    Bins are right-inclusive, matching pd.cut.
+    """
+    prices = np.asarray(prices, dtype='float64')
+    codes = np.searchsorted(PRICE_BINS, prices, side='left') - 1
+    codes[np.isnan(prices) | (codes >= len(PRICE_LABELS))] = -1
+    return codes
+
+
+def model_family(model):
+    """Groups model names into families: '3 Series' -> 'Series', 'X5' -> 'X', 'i8' -> 'i'."""
+    model = str(model)
+    if model.endswith('Series'):
+        return 'Series'
+    match = re.match(r'[A-Za-z]+', model)
+    return match.group(0) if match else model
+
+
+def row_hashes(df):
+    """One 64-bit hash per row of df's values; a row's hash does not depend on the rows around it."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def rows_fingerprint(hashes, columns):
+    """
+    SHA-256 of row hashes (see row_hashes) and the column names, used to
+    recognise already-processed rows. Slices of one hashes array fingerprint
+    any prefix of the rows without hashing them again.
+    """
+    digest = hashlib.sha256(hashes.tobytes())
+    digest.update(json.dumps([str(col) for col in columns]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def ensure_aggregates(data):
+    """Returns data as SalesAggregates, aggregating it first if it is a DataFrame."""
+    if isinstance(data, SalesAggregates):
+        return data
+    return SalesAggregates(data)
+
+
+class FactorizedSales:
+    """
+    Dimension codes and measure arrays of a sales DataFrame, extracted once.
+
+    Any number of SalesAggregates can be built from one instance over different
+    row selections, so slicing never copies the DataFrame itself.
+    """
+
+    def __init__(self, df):
+        sales = df['Sales_Volume'].to_numpy()
+        self.integer_sales = np.issubdtype(sales.dtype, np.integer)
+        self.weights = np.nan_to_num(sales.astype('float64'))
+        self.row_count = len(df)
+
+        # Factorize every dimension once
+        self.codes = {}
+        self.labels = {}
+        for dim in DIMENSIONS:
+            if dim == 'Price_Segment':
+                if 'Price_USD' not in df.columns:
+                    continue
+                self.codes[dim] = price_segment_codes(df['Price_USD'].to_numpy())
+                self.labels[dim] = pd.Index(PRICE_LABELS, name=dim)
+            elif dim in df.columns:
+                column = df[dim]
+                if isinstance(column.dtype, pd.CategoricalDtype):
+                    # Categoricals are already factorized, in category order
+                    dim_codes = column.cat.codes.to_numpy()
+                    uniques = column.cat.categories
+                else:
+                    dim_codes, uniques = pd.factorize(column, sort=True)
+                self.codes[dim] = dim_codes
+                self.labels[dim] = pd.Index(uniques, name=dim)
+
+        self.numeric_columns = [col for col in NUMERIC_COLUMNS if col in df.columns]
+        self.numeric_values = df[self.numeric_columns].to_numpy(dtype='float64')
+        self._row_keys = None
+
+    @property
+    def row_keys(self):
+        """Hash of each row's numeric values, computed on first use (see POINT_SAMPLE_SIZE)."""
+        if self._row_keys is None:
+            values = pd.DataFrame(self.numeric_values, columns=self.numeric_columns)
+            self._row_keys = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        return self._row_keys
+
+    def slice_rows(self, dim):
+        """
+        Returns {label: row indices} for every observed value of dim.
+        dim may also be 'Model_Family', which groups Model through model_family.
+        """
+        if dim == 'Model_Family':
+            families = [model_family(m) for m in self.labels['Model']]
+            labels, family_of_model = np.unique(families, return_inverse=True)
+            model_codes = self.codes['Model']
+            codes = np.where(model_codes >= 0, family_of_model[model_codes], -1)
+        else:
+            codes = self.codes[dim]
+            labels = self.labels[dim]
+
+        labels = pd.Index(labels).tolist()
+        # One sort groups the row indices of every label
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+        return {
+            labels[i]: order[bounds[i]:bounds[i + 1]]
+            for i in range(len(labels))
+            if bounds[i + 1] > bounds[i]
+        }
+
+
+class SalesAggregates:
+    """
+    Every Sales_Volume rollup needed by the report, computed in a single pass.
+
+    Each dimension column is factorized once and summed with np.bincount, so
+    the DataFrame is never copied or grouped more than once per dimension.
+    Build one per dataset and share it between BMWAnalyzer and BMWVisualizer.
+
+    data is a DataFrame or a FactorizedSales; rows optionally restricts the
+    aggregation to a subset of row indices (a slice of the dataset).
+
+    The state (per-label sums and counts, cross-tab cells, the co-moments
+    of the numeric columns, and the row sample and grid counts behind the
+    row-level plots) is mergeable, so partial aggregates of chunks
+    can be combined with merge() into the aggregate of the whole dataset.
+    """
+
+    def __init__(self, data, rows=None):
+        frame = data if isinstance(data, FactorizedSales) else FactorizedSales(data)
+        self.integer_sales = frame.integer_sales
+
+        take = (lambda array: array) if rows is None else (lambda array: array[rows])
+        weights = take(frame.weights)
+        codes = {dim: take(dim_codes) for dim, dim_codes in frame.codes.items()}
+        self.labels = dict(frame.labels)
+
+        self.row_count = len(weights)
+        self.sales_sum = weights.sum()
+
+        self.dim_sales = {}
+        self.dim_counts = {}
+        for dim, dim_codes in codes.items():
+            dim_codes, dim_weights = self._drop_missing(dim_codes >= 0, dim_codes, weights)
+            size = len(self.labels[dim])
+            self.dim_sales[dim] = np.bincount(dim_codes, weights=dim_weights, minlength=size)
+            self.dim_counts[dim] = np.bincount(dim_codes, minlength=size)
+
+        self.cell_sales = {}
+        self.cell_counts = {}
+        for row_dim, col_dim in CROSS_TABS:
+            if row_dim in codes and col_dim in codes:
+                self._cross_tab(row_dim, col_dim, codes, weights)
+
+        self.numeric_columns = frame.numeric_columns
+        self._compute_moments(take(frame.numeric_values))
+        # The row-level plot state is only built when a plot (or merge/save) needs it
+        self._point_source = (frame, rows)
+        self._points = None
+        self._views = None
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """Aggregates an iterable of DataFrame chunks, holding one chunk at a time."""
+        total = None
+        for chunk in chunks:
+            partial = cls(chunk)
+            total = partial if total is None else total.merge(partial)
+        if total is None:
+            raise ValueError("No data to aggregate.")
+        return total
+
+    def save(self, path, **metadata):
+        """
+        Persists the mergeable state (not the views) to an .npz file, together
+        with JSON-serializable metadata such as row fingerprints.
+        """
+        arrays = {
+            'means': self.means,
+            'comoments': self.comoments
+        }
+        for dim in self.labels:
+            arrays[f'dim_sales__{dim}'] = self.dim_sales[dim]
+            arrays[f'dim_counts__{dim}'] = self.dim_counts[dim]
+        for row_dim, col_dim in self.cell_counts:
+            arrays[f'cell_sales__{row_dim}__{col_dim}'] = self.cell_sales[(row_dim, col_dim)]
+            arrays[f'cell_counts__{row_dim}__{col_dim}'] = self.cell_counts[(row_dim, col_dim)]
+
+        arrays['point_keys'] = self.point_keys
+        arrays['point_values'] = self.point_values
+        for x, y in self.point_grids:
+            arrays[f'grid_bins__{x}__{y}'], arrays[f'grid_counts__{x}__{y}'] = self.point_grids[(x, y)]
+
+        header = {
+            "integer_sales": bool(self.integer_sales),
+            "row_count": int(self.row_count),
+            "sales_sum": float(self.sales_sum),
+            "moment_count": int(self.moment_count),
+            "numeric_columns": self.numeric_columns,
+            "labels": {dim: labels.tolist() for dim, labels in self.labels.items()},
+            "cross_tabs": [list(key) for key in self.cell_counts],
+            "point_grids": [list(key) for key in self.point_grids],
+            "points_version": POINTS_VERSION,
+            "metadata": metadata
+        }
+        arrays['header'] = np.frombuffer(json.dumps(header).encode('utf-8'), dtype='uint8')
+
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Restores aggregates saved with save(); returns (aggregates, metadata)."""
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(data['header'].tobytes().decode('utf-8'))
+            aggregates = cls.__new__(cls)
+            aggregates.integer_sales = header['integer_sales']
+            aggregates.row_count = header['row_count']
+            aggregates.sales_sum = header['sales_sum']
+            aggregates.moment_count = header['moment_count']
+            aggregates.numeric_columns = header['numeric_columns']
+            aggregates.means = data['means']
+            aggregates.comoments = data['comoments']
+            aggregates.labels = {dim: pd.Index(labels, name=dim) for dim, labels in header['labels'].items()}
+            aggregates.dim_sales = {dim: data[f'dim_sales__{dim}'] for dim in aggregates.labels}
+            aggregates.dim_counts = {dim: data[f'dim_counts__{dim}'] for dim in aggregates.labels}
+            aggregates.cell_sales = {}
+            aggregates.cell_counts = {}
+            for row_dim, col_dim in header['cross_tabs']:
+                aggregates.cell_sales[(row_dim, col_dim)] = data[f'cell_sales__{row_dim}__{col_dim}']
+                aggregates.cell_counts[(row_dim, col_dim)] = data[f'cell_counts__{row_dim}__{col_dim}']
+            if header.get('points_version') != POINTS_VERSION:
+                raise ValueError("Saved aggregates predate the current row-level plot state; recompute them.")
+            aggregates._point_source = None
+            aggregates._points = {
+                "keys": data['point_keys'],
+                "values": data['point_values'],
+                "grids": {(x, y): (data[f'grid_bins__{x}__{y}'], data[f'grid_counts__{x}__{y}'])
+                          for x, y in header['point_grids']}
+            }
+            aggregates._views = None
+        return aggregates, header['metadata']
+
+    @staticmethod
+    def _drop_missing(valid, *arrays):
+        """Filters arrays down to the valid rows, without copying when all are valid."""
+        if valid.all():
+            return arrays
+        return tuple(array[valid] for array in arrays)
+
+    def _to_sales_dtype(self, values):
+        """Float sums from np.bincount back to the dtype of Sales_Volume."""
+        if self.integer_sales:
+            return np.rint(values).astype('int64')
+        return values
+
+    def _cross_tab(self, row_dim, col_dim, codes, weights):
+        row_codes = codes[row_dim]
+        col_codes = codes[col_dim]
+        n_rows = len(self.labels[row_dim])
+        n_cols = len(self.labels[col_dim])
+
+        row_codes, col_codes, weights = self._drop_missing((row_codes >= 0) & (col_codes >= 0), row_codes, col_codes, weights)
+        combined = row_codes.astype('int64') * n_cols + col_codes
+        key = (row_dim, col_dim)
+        self.cell_sales[key] = np.bincount(combined, weights=weights, minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+        self.cell_counts[key] = np.bincount(combined, minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+
+    def _compute_moments(self, values):
+        """Count, means and centered co-moment matrix of the numeric columns."""
+        values = values[~np.isnan(values).any(axis=1)]
+        self.moment_count = len(values)
+        if self.moment_count:
+            self.means = values.mean(axis=0)
+            centered = values - self.means
+            self.comoments = centered.T @ centered
+        else:
+            self.means = np.zeros(len(self.numeric_columns))
+            self.comoments = np.zeros((len(self.numeric_columns),) * 2)
+
+    def __getstate__(self):
+        # Pickled copies (e.g. for plot worker processes) carry the built row-level state, not the rows
+        self._row_points()
+        return self.__dict__
+
+    def _row_points(self):
+        """Row sample and grid counts for the row-level plots, built on first use."""
+        if self._points is None:
+            frame, rows = self._point_source
+            take = (lambda array: array) if rows is None else (lambda array: array[rows])
+            codes = {dim: take(frame.codes[dim]) for x_y in POINT_GRIDS for dim in x_y if dim in frame.codes}
+            self._points = self._compute_points(take(frame.row_keys), take(frame.numeric_values), codes)
+            self._point_source = None
+        return self._points
+
+    @property
+    def point_keys(self):
+        return self._row_points()["keys"]
+
+    @property
+    def point_values(self):
+        return self._row_points()["values"]
+
+    @property
+    def point_grids(self):
+        return self._row_points()["grids"]
+
+    def _compute_points(self, keys, values, codes):
+        sample_keys, sample_values = self._bottom_rows(keys, values)
+        grids = {}
+        for x, y in POINT_GRIDS:
+            axes = []
+            for column in (x, y):
+                if column in codes:
+                    axes.append(codes[column].astype('int64'))
+                elif column in self.numeric_columns:
+                    column_values = values[:, self.numeric_columns.index(column)]
+                    with np.errstate(invalid='ignore'):
+                        axes.append(np.floor(column_values / POINT_BIN_WIDTHS[column]))
+            if len(axes) < 2:
+                continue
+            # Missing values (NaN bins, -1 codes) and negative values are left out
+            with np.errstate(invalid='ignore'):
+                valid = (axes[0] >= 0) & (axes[1] >= 0)
+            xs, ys = (axis[valid].astype('int64') for axis in axes)
+            grids[(x, y)] = self._count_bins(xs, ys)
+        return {"keys": sample_keys, "values": sample_values, "grids": grids}
+
+    @staticmethod
+    def _bottom_rows(keys, values):
+        """The POINT_SAMPLE_SIZE rows with the smallest keys, ordered by key."""
+        if len(keys) > POINT_SAMPLE_SIZE:
+            keep = np.argpartition(keys, POINT_SAMPLE_SIZE)[:POINT_SAMPLE_SIZE]
+            keys, values = keys[keep], values[keep]
+        order = np.argsort(keys, kind='stable')
+        return keys[order], values[order]
+
+    @staticmethod
+    def _count_bins(xs, ys, counts=None):
+        """
+        Sums the counts (1 per row by default) of equal (x, y) bins and returns
+        (unique bins as an (n, 2) array, counts).
+        """
+        if not len(xs):
+            return np.zeros((0, 2), dtype='int64'), np.zeros(0, dtype='int64')
+        x_low, y_low = xs.min(), ys.min()
+        x_span, y_span = xs.max() - x_low + 1, ys.max() - y_low + 1
+        if x_span * y_span <= DENSE_GRID_CELLS:
+            # Typical grids are small: count on a dense grid, keep the non-empty cells
+            totals = np.bincount((xs - x_low) * y_span + (ys - y_low), weights=counts,
+                                 minlength=x_span * y_span)
+            cells = np.flatnonzero(totals)
+            unique_bins = np.column_stack([cells // y_span + x_low, cells % y_span + y_low])
+            return unique_bins, np.rint(totals[cells]).astype('int64')
+        # Bins are non-negative and far below 2**31, so one int64 key identifies a pair
+        unique_keys, inverse = np.unique((xs << 31) | ys, return_inverse=True)
+        totals = np.bincount(inverse.reshape(-1), weights=counts, minlength=len(unique_keys))
+        unique_bins = np.column_stack([unique_keys >> 31, unique_keys & (2**31 - 1)])
+        return unique_bins, np.rint(totals).astype('int64')
+
+    def _build_views(self):
+        """
+        Derives the report-facing Series/DataFrames from the mergeable state.
+        Built lazily, so folding many chunks does not rebuild them every time.
+        """
+        if self._views is not None:
+            return self._views
+
+        sales = {}
+        counts = {}
+        for dim, dim_counts in self.dim_counts.items():
+            observed = dim_counts > 0
+            index = self.labels[dim][observed]
+            sales[dim] = pd.Series(self._to_sales_dtype(self.dim_sales[dim][observed]), index=index, name='Sales_Volume')
+            counts[dim] = pd.Series(dim_counts[observed], index=index, name='count')
+
+        cross_sales = {}
+        cross_counts = {}
+        for (row_dim, col_dim), cell_counts in self.cell_counts.items():
+            # Keep only the rows and columns that were observed together
+            row_mask = cell_counts.sum(axis=1) > 0
+            col_mask = cell_counts.sum(axis=0) > 0
+            cell_sales = self.cell_sales[(row_dim, col_dim)][row_mask][:, col_mask]
+            cell_counts = cell_counts[row_mask][:, col_mask]
+
+            index = self.labels[row_dim][row_mask]
+            columns = self.labels[col_dim][col_mask]
+            if (cell_counts == 0).any():
+                # Missing combinations are 0.0, as pivot_table(...).fillna(0) reports them
+                values = cell_sales
+            else:
+                values = self._to_sales_dtype(cell_sales)
+
+            cross_sales[(row_dim, col_dim)] = pd.DataFrame(values, index=index, columns=columns)
+            cross_counts[(row_dim, col_dim)] = pd.DataFrame(cell_counts, index=index, columns=columns)
+
+        self._views = {
+            'sales': sales,
+            'counts': counts,
+            'cross_sales': cross_sales,
+            'cross_counts': cross_counts
+        }
+        return self._views
+
+    def merge(self, other):
+        """
+        Folds another SalesAggregates (e.g. of the next chunk) into this one
+        and returns self. Label sets may differ between the two.
+        """
+        if other.numeric_columns != self.numeric_columns:
+            raise ValueError("Cannot merge aggregates with different numeric columns.")
+
+        self.integer_sales = self.integer_sales and other.integer_sales
+        self.row_count += other.row_count
+        self.sales_sum += other.sales_sum
+
+        positions = {}
+        for dim in set(self.labels) | set(other.labels):
+            merged = self._merge_labels(dim, self.labels.get(dim), other.labels.get(dim))
+            positions[dim] = (self._positions(merged, self.labels.get(dim)),
+                              self._positions(merged, other.labels.get(dim)))
+            size = len(merged)
+            for state in ('dim_sales', 'dim_counts'):
+                ours, theirs = getattr(self, state).get(dim), getattr(other, state).get(dim)
+                combined = np.zeros(size, dtype='float64' if state == 'dim_sales' else 'int64')
+                for values, pos in ((ours, positions[dim][0]), (theirs, positions[dim][1])):
+                    if values is not None:
+                        combined[pos] += values
+                getattr(self, state)[dim] = combined
+            self.labels[dim] = merged
+
+        for key in set(self.cell_counts) | set(other.cell_counts):
+            row_dim, col_dim = key
+            shape = (len(self.labels[row_dim]), len(self.labels[col_dim]))
+            for state in ('cell_sales', 'cell_counts'):
+                combined = np.zeros(shape, dtype='float64' if state == 'cell_sales' else 'int64')
+                for side, source in enumerate((self, other)):
+                    values = getattr(source, state).get(key)
+                    if values is not None:
+                        rows, cols = positions[row_dim][side], positions[col_dim][side]
+                        combined[np.ix_(rows, cols)] += values
+                getattr(self, state)[key] = combined
+
+        self._merge_moments(other)
+        self._merge_points(other, positions)
+        self._views = None
+        return self
+
+    @staticmethod
+    def _merge_labels(dim, ours, theirs):
+        if ours is None:
+            return theirs
+        if theirs is None or ours.equals(theirs):
+            return ours
+        if dim == 'Price_Segment':
+            return ours
+        # Same order a sorted groupby over the combined data would produce
+        return ours.append(theirs).unique().sort_values().rename(dim)
+
+    @staticmethod
+    def _positions(merged, labels):
+        return None if labels is None else merged.get_indexer(labels)
+
+    def _merge_points(self, other, positions):
+        # Built on both sides first, so the merged aggregates never hold on to the rows of a chunk
+        points = self._row_points()
+        points["keys"], points["values"] = self._bottom_rows(
+            np.concatenate([self.point_keys, other.point_keys]),
+            np.concatenate([self.point_values, other.point_values]))
+
+        for key in set(self.point_grids) | set(other.point_grids):
+            bins, counts = [], []
+            for side, source in enumerate((self, other)):
+                if key not in source.point_grids:
+                    continue
+                side_bins, side_counts = source.point_grids[key]
+                side_bins = side_bins.copy()
+                for axis, column in enumerate(key):
+                    if column in positions:
+                        # Category codes of this side -> codes of the merged labels
+                        side_bins[:, axis] = positions[column][side][side_bins[:, axis]]
+                bins.append(side_bins)
+                counts.append(side_counts)
+            bins = np.concatenate(bins)
+            self.point_grids[key] = self._count_bins(bins[:, 0], bins[:, 1], np.concatenate(counts))
+
+    def _merge_moments(self, other):
+        """Chan et al. pairwise update of the means and co-moment matrix."""
+        n_a, n_b = self.moment_count, other.moment_count
+        if n_b == 0:
+            return
+        if n_a == 0:
+            self.moment_count, self.means, self.comoments = n_b, other.means.copy(), other.comoments.copy()
+            return
+        n = n_a + n_b
+        delta = other.means - self.means
+        self.means = self.means + delta * (n_b / n)
+        self.comoments = self.comoments + other.comoments + np.outer(delta, delta) * (n_a * n_b / n)
+        self.moment_count = n
+
+    @property
+    def total_sales(self):
+        return self._to_sales_dtype(self.sales_sum)
+
+    def sales_by(self, dim):
+        """Sales_Volume per value of a dimension, ordered like a sorted groupby."""
+        return self._build_views()['sales'][dim].copy()
+
+    def count_by(self, dim):
+        """Number of rows per value of a dimension."""
+        return self._build_views()['counts'][dim].copy()
+
+    def sales_by_pair(self, row_dim, col_dim):
+        """Sales_Volume for every observed (row_dim, col_dim) combination."""
+        return self._build_views()['cross_sales'][(row_dim, col_dim)].copy()
+
+    def count_by_pair(self, row_dim, col_dim):
+        """Number of rows for every observed (row_dim, col_dim) combination."""
+        return self._build_views()['cross_counts'][(row_dim, col_dim)].copy()
+
+    def point_sample(self, columns):
+        """Up to POINT_SAMPLE_SIZE rows of the given numeric columns (a uniform sample)."""
+        indexes = [self.numeric_columns.index(col) for col in columns]
+        return pd.DataFrame(self.point_values[:, indexes], columns=columns)
+
+    def binned_counts(self, x, y, max_bins=None):
+        """
+        Row counts per (x, y) grid cell of one of POINT_GRIDS, as a DataFrame
+        with the bin centers (or dimension labels) and a count column. With
+        max_bins, numeric axes spanning more bins are coarsened to fit; the
+        resulting bin widths are in the DataFrame's attrs['bin_widths'].
+        """
+        bins, counts = self.point_grids[(x, y)]
+        columns = {}
+        widths = {}
+        for axis, column in enumerate((x, y)):
+            axis_bins = bins[:, axis]
+            if column in self.labels:
+                columns[column] = self.labels[column][axis_bins]
+                continue
+            width = POINT_BIN_WIDTHS[column]
+            if max_bins and len(axis_bins) and axis_bins.max() - axis_bins.min() >= max_bins:
+                factor = -(-(int(axis_bins.max() - axis_bins.min()) + 1) // max_bins)
+                axis_bins = axis_bins // factor
+                width *= factor
+            columns[column] = (axis_bins + 0.5) * width
+            widths[column] = width
+
+        frame = pd.DataFrame(columns)
+        frame['count'] = counts
+        if x != y:
+            frame = frame.groupby([x, y], sort=True, observed=True)['count'].sum().reset_index()
+        frame.attrs['bin_widths'] = widths
+        return frame
+
+    def correlation_matrix(self):
+        """Pearson correlation matrix of the numeric columns."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.sqrt(np.diag(self.comoments))
+            corr = self.comoments / np.outer(scale, scale)
+        return pd.DataFrame(corr, index=self.numeric_columns, columns=self.numeric_columns)
@@ -1,59 +1,117 @@
-import pandas as pd
+import os
+from src.aggregates import SalesAggregates, ensure_aggregates, row_hashes, rows_fingerprint
+
+# Correlations merged from chunks differ from a single pass only by float round-off
+CORRELATION_DECIMALS = 12
 
 class BMWAnalyzer:
-    def __init__(self, df):
-        self.df = df
+    def __init__(self, data):
+        # Accepts a DataFrame or a shared SalesAggregates; the getters below are views over it
+        self.aggregates = ensure_aggregates(data)
+
+    @classmethod
+    def from_state(cls, df, state_path, verify=False):
+        """
+        Builds an analyzer for df, reusing the aggregate state saved at
+        state_path by a previous run. When df is the previously processed data
+        with new rows appended, only the new rows are aggregated; otherwise
+        everything is recomputed. The updated state is saved back to state_path
+        (unless nothing was appended).
+
+        verify: also run a full recompute and fall back to it if the
+        incrementally updated summary stats differ.
+        """
+        # Hashed once: the prefix check and the new fingerprint both use these
+        hashes = row_hashes(df)
+        aggregates = None
+        unchanged = False
+        if os.path.exists(state_path):
+            try:
+                aggregates, metadata = SalesAggregates.load(state_path)
+            except Exception as e:
+                print(f"Warning: Ignoring unreadable aggregate state: {e}")
+            else:
+                processed = metadata.get("processed_rows", 0)
+                if not cls._is_prefix(df, hashes, processed, metadata):
+                    print("Data changed since the saved state; recomputing all aggregates.")
+                    aggregates = None
+                elif processed < len(df):
+                    print(f"Aggregating {len(df) - processed} new rows.")
+                    aggregates.merge(SalesAggregates(df.iloc[processed:]))
+                else:
+                    print("No new rows since the saved state.")
+                    unchanged = True
+
+        if aggregates is None:
+            aggregates = SalesAggregates(df)
+
+        analyzer = cls(aggregates)
+        if verify:
+            expected = cls(df)
+            if analyzer.get_summary_stats() != expected.get_summary_stats():
+                print("Warning: Incremental aggregates differ from a full recompute; using the full recompute.")
+                analyzer = expected
+                unchanged = False
+            else:
+                print("Incremental aggregates verified against a full recompute.")
+
+        if not unchanged:
+            analyzer.aggregates.save(state_path, **cls._fingerprints(df, hashes))
+        return analyzer
+
+    @staticmethod
+    def _fingerprints(df, hashes):
+        return {
+            "processed_rows": len(df),
+            "rows_sha256": rows_fingerprint(hashes, df.columns)
+        }
+
+    @staticmethod
+    def _is_prefix(df, hashes, processed, metadata):
+        """
+        Checks that the first `processed` rows of df are the rows saved in the
+        state. Every row is hashed, so a change anywhere in them is detected.
+        """
+        if processed > len(df):
+            return False
+        return rows_fingerprint(hashes[:processed], df.columns) == metadata.get("rows_sha256")
 
     def get_yearly_sales(self):
         """Aggregates sales volume by year."""
-        return self.df.groupby('Year')['Sales_Volume'].sum().sort_index()
+        return self.aggregates.sales_by('Year').sort_index()
 
     def get_regional_sales(self):
         """Aggregates sales volume by region."""
-        return self.df.groupby('Region')['Sales_Volume'].sum().sort_values(ascending=False)
+        return self.aggregates.sales_by('Region').sort_values(ascending=False)
 
     def get_top_models(self, n=5):
         """Returns top n performing models."""
-        return self.df.groupby('Model')['Sales_Volume'].sum().sort_values(ascending=False).head(n)
-    
+        return self.aggregates.sales_by('Model').sort_values(ascending=False).head(n)
+
     def get_fuel_type_trends(self):
         """Aggregates sales volume by Year and Fuel_Type."""
-        return self.df.pivot_table(index='Year', columns='Fuel_Type', values='Sales_Volume', aggfunc='sum').fillna(0)
+        return self.aggregates.sales_by_pair('Year', 'Fuel_Type')
 
     def get_transmission_sales(self):
         """Aggregates sales volume by Transmission."""
-        return self.df.groupby('Transmission')['Sales_Volume'].sum().sort_values(ascending=False)
+        return self.aggregates.sales_by('Transmission').sort_values(ascending=False)
 
     def get_correlations(self):
         """Calculates correlation matrix for numerical features vs Sales_Volume."""
-        numeric_cols = ['Engine_Size_L', 'Mileage_KM', 'Price_USD', 'Sales_Volume']
-        # Filter only existing numeric columns to be safe
-        cols_to_use = [col for col in numeric_cols if col in self.df.columns]
-        return self.df[cols_to_use].corr()['Sales_Volume'].sort_values(ascending=False)
+        return self.aggregates.correlation_matrix()['Sales_Volume'].sort_values(ascending=False)
 
     def get_price_segments(self):
         """Bins Price_USD into segments and aggregates sales."""
-        bins = [0, 40000, 70000, 100000, float('inf')]
-        labels = ['Budget (<40k)', 'Mid-Range (40k-70k)', 'Premium (70k-100k)', 'Luxury (>100k)']
-        
-        # Avoid SettingWithCopyWarning
-        df_copy = self.df.copy()
-        df_copy['Price_Segment'] = pd.cut(df_copy['Price_USD'], bins=bins, labels=labels)
-        return df_copy.groupby('Price_Segment')['Sales_Volume'].sum()
+        return self.aggregates.sales_by('Price_Segment')
 
     def get_color_sales(self):
         """Aggregates sales by Color."""
-        return self.df.groupby('Color')['Sales_Volume'].sum().sort_values(ascending=False)
+        return self.aggregates.sales_by('Color').sort_values(ascending=False)
 
     def get_fuel_by_price_segment(self):
         """Aggregates sales by Price Segment and Fuel Type."""
-        bins = [0, 40000, 70000, 100000, float('inf')]
-        labels = ['Budget (<40k)', 'Mid-Range (40k-70k)', 'Premium (70k-100k)', 'Luxury (>100k)']
-        
-        df_copy = self.df.copy()
-        df_copy['Price_Segment'] = pd.cut(df_copy['Price_USD'], bins=bins, labels=labels)
-        return df_copy.groupby(['Price_Segment', 'Fuel_Type'])['Sales_Volume'].sum().unstack().fillna(0)
-    
+        return self.aggregates.sales_by_pair('Price_Segment', 'Fuel_Type')
+
     def get_summary_stats(self):
         """Returns a dictionary of summary statistics for the LLM prompt."""
         yearly = self.get_yearly_sales()
@@ -65,9 +123,9 @@ class BMWAnalyzer:
         price_segments = self.get_price_segments()
         color_sales = self.get_color_sales()
         fuel_by_segment = self.get_fuel_by_price_segment()
-        
+
         return {
-            "total_sales": int(self.df['Sales_Volume'].sum()),
+            "total_sales": int(self.aggregates.total_sales),
             "yearly_trend": yearly.to_dict(),
             "top_region": regional.index[0],
             "top_region_sales": int(regional.iloc[0]),
@@ -76,6 +134,7 @@ class BMWAnalyzer:
             "transmission_split": transmission.to_dict(),
             "price_segments": price_segments.to_dict(),
             "color_sales": color_sales.head(5).to_dict(),
-            "correlations": correlations.drop('Sales_Volume').to_dict(), # Exclude self-correlation
+            # Exclude self-correlation; rounded so chunked and in-memory runs agree exactly
+            "correlations": correlations.drop('Sales_Volume').round(CORRELATION_DECIMALS).to_dict(),
             "fuel_by_segment": fuel_by_segment.to_dict()
         }
@@ -0,0 +1,129 @@
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# Batch dimension name -> (slice dimension, heading on the index page)
+SLICE_DIMENSIONS = {
+    'region': ('Region', 'Region'),
+    'year': ('Year', 'Year'),
+    'model': ('Model_Family', 'Model Family')
+}
+
+
+def slugify(text):
+    return re.sub(r'[^A-Za-z0-9]+', '_', str(text)).strip('_') or 'slice'
+
+
+class RateLimitedScheduler:
+    """
+    Runs coroutines with at most max_concurrency in flight and at most
+    rate_per_minute started per minute. Create it inside the running event loop.
+    """
+
+    def __init__(self, max_concurrency=4, rate_per_minute=60):
+        if max_concurrency < 1:
+            # A zero-slot semaphore would block every request forever
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._interval = 60.0 / rate_per_minute if rate_per_minute else 0.0
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def run(self, coro_fn, *args, **kwargs):
+        async with self._semaphore:
+            await self._wait_turn()
+            return await coro_fn(*args, **kwargs)
+
+    async def _wait_turn(self):
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            start = max(now, self._next_start)
+            self._next_start = start + self._interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class BatchReportRunner:
+    """
+    Builds one report per data slice (Region, Year, Model family) plus an index page.
+
+    The data is factorized once; each slice aggregates its own row indices on a
+    worker pool, and the LLM requests go through a RateLimitedScheduler.
+    """
+
+    def __init__(self, df, narrate, output_dir='output/batch', workers=4,
+                 max_concurrency=4, rate_per_minute=60, plot_options=None, report_options=None,
+                 transport=None, render_options=None):
+        """
+        narrate: coroutine function (summary_stats) -> markdown narrative.
+        plot_options / report_options: keyword arguments for BMWVisualizer / ReportGenerator.
+        render_options: keyword arguments for BMWVisualizer.generate_all_plots
+        (plot workers per slice).
+        transport: the ResilientTransport narrate sends its requests through.
+        The limits then apply to each request (a sectioned narrative makes
+        several); without one they apply to each narrate call.
+        """
+        # Imported here so that reading SLICE_DIMENSIONS (e.g. for CLI choices) stays cheap
+        from src.aggregates import FactorizedSales
+        from src.report_generator import ReportGenerator
+
+        self.frame = FactorizedSales(df)
+        self.narrate = narrate
+        self.output_dir = output_dir
+        self.plot_options = plot_options or {}
+        self.render_options = render_options or {}
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.rate_per_minute = rate_per_minute
+        self.transport = transport
+        self.generator = ReportGenerator(output_dir, **(report_options or {}))
+        self.report_paths = []
+
+    def run(self, dimensions):
+        """Generates every slice report for the given batch dimensions; returns the index path."""
+        return asyncio.run(self._run(dimensions))
+
+    async def _run(self, dimensions):
+        scheduler = RateLimitedScheduler(self.max_concurrency, self.rate_per_minute)
+        if self.transport is not None:
+            # Limit the requests themselves; narrate calls then run unthrottled
+            previous_limiter, self.transport.limiter = self.transport.limiter, scheduler
+            scheduler = None
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                tasks = []
+                for name in dimensions:
+                    dim, heading = SLICE_DIMENSIONS[name]
+                    for label, rows in self.frame.slice_rows(dim).items():
+                        tasks.append(self._run_slice(pool, scheduler, heading, label, rows))
+                reports = await asyncio.gather(*tasks)
+        finally:
+            if self.transport is not None:
+                self.transport.limiter = previous_limiter
+        self.report_paths = [report_path for _, _, report_path in reports]
+        return self.generator.generate_index(reports)
+
+    async def _run_slice(self, pool, scheduler, heading, label, rows):
+        loop = asyncio.get_running_loop()
+        summary_stats, plot_htmls = await loop.run_in_executor(pool, self._analyze_slice, rows)
+        if scheduler is not None:
+            narrative = await scheduler.run(self.narrate, summary_stats)
+        else:
+            narrative = await self.narrate(summary_stats)
+
+        slice_label = f"{heading}: {label}"
+        filename = f"{slugify(heading)}_{slugify(label)}.html"
+        report_path = await loop.run_in_executor(
+            pool, self.generator.generate_interactive_report, narrative, plot_htmls, filename, slice_label)
+        print(f"Report generated for {slice_label}")
+        return heading, label, report_path
+
+    def _analyze_slice(self, rows):
+        from src.aggregates import SalesAggregates
+        from src.analyzer import BMWAnalyzer
+        from src.visualizer import BMWVisualizer
+
+        aggregates = SalesAggregates(self.frame, rows)
+        summary_stats = BMWAnalyzer(aggregates).get_summary_stats()
+        plot_htmls = BMWVisualizer(aggregates, **self.plot_options).generate_all_plots(**self.render_options)
+        return summary_stats, plot_htmls
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+
+def canonicalize(value):
+    """
+    Converts nested stats (dicts keyed by ints, numpy scalars, ...) into plain
+    JSON types so that equal data always serializes to the same text.
+    """
+    if isinstance(value, dict):
+        return {str(k): canonicalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(v) for v in value]
+    if hasattr(value, 'item') and callable(value.item):
+        # numpy scalars
+        return canonicalize(value.item())
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def content_hash(*parts):
+    """SHA-256 over the canonical JSON form of parts."""
+    payload = json.dumps(canonicalize(list(parts)), sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    """
+    Small content-addressed cache of JSON values, one file per key.
+
+    Entries older than ttl seconds are treated as missing. Once the directory
+    grows beyond max_bytes or max_entries, the least recently used entries
+    (by file mtime, refreshed on every hit) are evicted.
+    """
+
+    def __init__(self, directory, ttl=None, max_bytes=50 * 1024 * 1024, max_entries=1000):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key, allow_expired=False):
+        """
+        Returns the cached value, or None on a miss or an expired entry.
+        Expired entries stay on disk until evicted, so with allow_expired
+        they can still serve as a fallback.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not allow_expired and self.ttl is not None and time.time() - entry.get('created', 0) > self.ttl:
+            return None
+
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get('value')
+
+    def set(self, key, value):
+        entry = {"created": time.time(), "value": value}
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                self._remove(os.path.join(self.directory, name))
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (total_bytes > self.max_bytes or len(entries) > self.max_entries):
+            _, size, path = entries.pop(0)
+            self._remove(path)
+            total_bytes -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,194 @@
+import operator
+import os
+import re
+import shutil
+
+# Directory levels of a partitioned dataset: data/Year=2023/Region=Asia/part-0.parquet
+PARTITION_COLUMNS = ['Year', 'Region']
+
+# File extension -> dataset format
+DATASET_FORMATS = {'.parquet': 'parquet', '.pq': 'parquet', '.csv': 'csv'}
+
+# Filter operator -> comparison; works on pandas Series and pyarrow.dataset fields alike
+COMPARISONS = {'==': operator.eq, '!=': operator.ne, '>=': operator.ge,
+               '<=': operator.le, '>': operator.gt, '<': operator.lt}
+FILTER_OPERATORS = list(COMPARISONS) + ['in', 'not in']
+
+# "Year>=2023", "Region==Asia", "Model in X5,X6"
+FILTER_PATTERN = re.compile(r'^\s*(\w+)\s*(==|!=|>=|<=|>|<|\s+not\s+in\s+|\s+in\s+)\s*(.+?)\s*$')
+
+
+def parse_filter(text):
+    """
+    Parses a command line filter such as "Year>=2023", "Region==Asia" or
+    "Model in X5,X6" into a (column, operator, value) tuple.
+    """
+    match = FILTER_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Invalid filter: {text!r} (expected e.g. Year>=2023 or Region==Asia)")
+    column, operator_name, value = match.group(1), ' '.join(match.group(2).split()), match.group(3)
+    if operator_name in ('in', 'not in'):
+        return column, operator_name, [_parse_value(v.strip()) for v in value.split(',')]
+    return column, operator_name, _parse_value(value)
+
+
+def _parse_value(text):
+    text = text.strip('\'"')
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def filter_columns(filters):
+    return [column for column, _, _ in filters or []]
+
+
+def _condition(values, operator_name, value):
+    if operator_name == 'in':
+        return values.isin(value)
+    if operator_name == 'not in':
+        return ~values.isin(value)
+    if operator_name not in COMPARISONS:
+        raise ValueError(f"Unknown filter operator: {operator_name}. Available: {FILTER_OPERATORS}")
+    return COMPARISONS[operator_name](values, value)
+
+
+def to_expression(filters):
+    """The conjunction of (column, operator, value) filters as a pyarrow.dataset expression."""
+    import pyarrow.dataset as ds
+
+    expression = None
+    for column, operator_name, value in filters or []:
+        condition = _condition(ds.field(column), operator_name, value)
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def apply_filters(df, filters):
+    """Keeps the DataFrame rows matching every filter (for sources without pushdown)."""
+    if not filters:
+        return df
+    mask = None
+    for column, operator_name, value in filters:
+        condition = _condition(df[column], operator_name, value)
+        mask = condition if mask is None else mask & condition
+    return df[mask.to_numpy()].reset_index(drop=True)
+
+
+def dataset_format(directory):
+    """Format of the data files below directory ('parquet' or 'csv')."""
+    for _, _, files in os.walk(directory):
+        for name in sorted(files):
+            file_format = DATASET_FORMATS.get(os.path.splitext(name)[1].lower())
+            if file_format:
+                return file_format
+    raise ValueError(f"No Parquet or CSV files found in {directory}")
+
+
+class PartitionedDataset:
+    """
+    A directory of Hive-style partitioned Parquet or CSV files
+    (Year=2023/Region=Asia/...), or a single Parquet or CSV file. Reads push
+    the column projection and the filters down to pyarrow: partitions whose
+    directory values cannot match a filter are never opened, only the
+    requested columns are decoded, and Parquet row groups are skipped using
+    their min/max statistics.
+    """
+
+    def __init__(self, path):
+        import pyarrow.dataset as ds
+
+        self.path = path
+        if os.path.isdir(path):
+            self.format = dataset_format(path)
+            partitioning = 'hive'
+        else:
+            self.format = DATASET_FORMATS.get(os.path.splitext(path)[1].lower())
+            partitioning = None
+            if self.format is None:
+                raise ValueError(f"Unsupported dataset file: {path}")
+        self.dataset = ds.dataset(path, format=self.format, partitioning=partitioning,
+                                  exclude_invalid_files=True)
+
+    @property
+    def columns(self):
+        return self.dataset.schema.names
+
+    @property
+    def files(self):
+        return self.dataset.files
+
+    def matching_files(self, filters=None):
+        """Data files that may hold rows matching filters (after partition pruning)."""
+        return [fragment.path for fragment in self.dataset.get_fragments(filter=to_expression(filters))]
+
+    def read(self, columns=None, filters=None):
+        """The matching rows of the given columns (all by default) as a DataFrame."""
+        return self.dataset.to_table(columns=columns, filter=to_expression(filters)).to_pandas()
+
+    def iter_batches(self, chunksize, columns=None, filters=None):
+        """Streams the matching rows as DataFrames of at most chunksize rows."""
+        for batch in self.dataset.to_batches(columns=columns, filter=to_expression(filters),
+                                             batch_size=chunksize):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+
+def write_partitioned(chunks, directory, file_format='parquet', partition_columns=None, overwrite=False,
+                      dtypes=None):
+    """
+    Writes DataFrame chunks (e.g. DataLoader.iter_chunks) as a partitioned
+    dataset under directory and returns the number of rows written. The
+    dataset is built in a temporary directory and moved into place at the
+    end, so readers never see a partial layout.
+
+    Every chunk is written with the schema of the first one, with the columns
+    in dtypes ({column: dtype}, e.g. DATASET_DTYPES) widened to the given
+    dtype, so chunks downcast to different dtypes still share one schema.
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if file_format not in ('parquet', 'csv'):
+        raise ValueError(f"Unsupported dataset format: {file_format}")
+    if os.path.exists(directory) and not overwrite:
+        raise FileExistsError(f"{directory} already exists")
+
+    partition_columns = list(partition_columns or PARTITION_COLUMNS)
+    tmp_directory = directory.rstrip('/\\') + '.tmp'
+    if os.path.exists(tmp_directory):
+        shutil.rmtree(tmp_directory)
+
+    rows = 0
+    schema = None
+    partitioning = None
+    for i, chunk in enumerate(chunks):
+        chunk = chunk.copy()
+        for column in chunk.columns:
+            # Directory names carry plain values; CSV files cannot hold dictionary columns
+            if str(chunk[column].dtype) == 'category' and (column in partition_columns or file_format == 'csv'):
+                chunk[column] = chunk[column].astype(object)
+        if schema is None:
+            schema = pa.Table.from_pandas(chunk, preserve_index=False).schema.remove_metadata()
+            for column, dtype in (dtypes or {}).items():
+                if column in schema.names:
+                    schema = schema.set(schema.get_field_index(column),
+                                        pa.field(column, pa.from_numpy_dtype(np.dtype(dtype))))
+            partitioning = ds.partitioning(pa.schema([schema.field(c) for c in partition_columns]),
+                                           flavor='hive')
+        table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+        ds.write_dataset(table, tmp_directory, format=file_format, partitioning=partitioning,
+                         basename_template=f"part-{i}-{{i}}.{file_format}",
+                         existing_data_behavior='overwrite_or_ignore')
+        rows += len(chunk)
+
+    if rows == 0:
+        raise ValueError("No data to write.")
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(tmp_directory, directory)
+    return rows
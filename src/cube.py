@@ -0,0 +1,236 @@
+import json
+import numpy as np
+import pandas as pd
+from src.aggregates import DIMENSIONS, FactorizedSales, SalesAggregates
+
+COUNT = 'count'
+
+
+class SalesCube:
+    """
+    Pre-aggregated cube over the dimension columns, for ad-hoc drill-downs
+    (Region x Model x Year, Fuel_Type by Region, ...) without the raw rows.
+
+    Stored sparsely: one row of category codes per observed combination of
+    dimension values (-1 where a value is missing), with the summed measures
+    and the number of rows in that cell. Rollups, slices and top-N queries
+    only regroup these cells, so they take milliseconds at any table size.
+
+    data is a DataFrame or a FactorizedSales; measures are summed columns
+    (Sales_Volume or any of the numeric columns).
+    """
+
+    def __init__(self, data, dimensions=None, measures=('Sales_Volume',)):
+        frame = data if isinstance(data, FactorizedSales) else FactorizedSales(data)
+        self.dimensions = [dim for dim in (dimensions or DIMENSIONS) if dim in frame.codes]
+        self.labels = {dim: frame.labels[dim] for dim in self.dimensions}
+        self.measures = list(measures)
+        self.integer_sales = frame.integer_sales
+
+        values = {}
+        for measure in self.measures:
+            if measure == 'Sales_Volume':
+                values[measure] = frame.weights
+            elif measure in frame.numeric_columns:
+                column = frame.numeric_values[:, frame.numeric_columns.index(measure)]
+                values[measure] = np.nan_to_num(column)
+            else:
+                raise ValueError(f"Unknown measure: {measure}")
+
+        codes = np.column_stack([frame.codes[dim] for dim in self.dimensions]) if self.dimensions \
+            else np.zeros((frame.row_count, 0), dtype='int8')
+        self._set_cells(codes, values, np.ones(frame.row_count, dtype='int64'))
+
+    @classmethod
+    def from_chunks(cls, chunks, dimensions=None, measures=('Sales_Volume',)):
+        """Builds the cube from an iterable of DataFrame chunks, holding one chunk at a time."""
+        cube = None
+        for chunk in chunks:
+            partial = cls(chunk, dimensions, measures)
+            cube = partial if cube is None else cube.merge(partial)
+        if cube is None:
+            raise ValueError("No data to aggregate.")
+        return cube
+
+    @property
+    def cell_count(self):
+        return len(self.counts)
+
+    def _set_cells(self, codes, sums, counts):
+        """Collapses rows (or cells) with equal codes into one cell each."""
+        sizes = [len(self.labels[dim]) for dim in self.dimensions]
+        if len(codes):
+            keys = self._cell_keys(codes, sizes)
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            codes = codes[first]
+            sums = {m: np.bincount(inverse, weights=v, minlength=len(first)) for m, v in sums.items()}
+            counts = np.bincount(inverse, weights=counts, minlength=len(first))
+        self.codes = codes.astype(self._code_dtype(sizes))
+        self.sums = sums
+        self.counts = np.rint(counts).astype('int64')
+
+    @staticmethod
+    def _cell_keys(codes, sizes):
+        """One int64 key per row of codes (mixed radix, with room for -1)."""
+        radix = np.array(sizes, dtype='int64') + 1
+        if np.prod(radix.astype('float64')) >= 2**62:
+            # Too many combinations for one integer; fall back to row-wise unique
+            _, keys = np.unique(codes, axis=0, return_inverse=True)
+            return keys.reshape(-1)
+        keys = np.zeros(len(codes), dtype='int64')
+        for i, size in enumerate(radix):
+            keys = keys * size + (codes[:, i].astype('int64') + 1)
+        return keys
+
+    @staticmethod
+    def _code_dtype(sizes):
+        largest = max(sizes, default=0)
+        for dtype in ('int8', 'int16', 'int32'):
+            if largest <= np.iinfo(dtype).max:
+                return dtype
+        return 'int64'
+
+    def merge(self, other):
+        """Folds another cube (e.g. of the next chunk) into this one and returns self."""
+        if other.dimensions != self.dimensions or other.measures != self.measures:
+            raise ValueError("Cannot merge cubes with different dimensions or measures.")
+
+        columns = []
+        for i, dim in enumerate(self.dimensions):
+            merged = SalesAggregates._merge_labels(dim, self.labels[dim], other.labels[dim])
+            columns.append(np.concatenate([
+                self._recode(self.codes[:, i], self.labels[dim], merged),
+                self._recode(other.codes[:, i], other.labels[dim], merged)
+            ]))
+            self.labels[dim] = merged
+
+        codes = np.column_stack(columns) if columns else np.zeros((self.cell_count + other.cell_count, 0))
+        sums = {m: np.concatenate([self.sums[m], other.sums[m]]) for m in self.measures}
+        self.integer_sales = self.integer_sales and other.integer_sales
+        self._set_cells(codes.astype('int64'), sums, np.concatenate([self.counts, other.counts]))
+        return self
+
+    @staticmethod
+    def _recode(codes, labels, merged):
+        if labels is merged or labels.equals(merged):
+            return codes.astype('int64')
+        positions = merged.get_indexer(labels)
+        return np.where(codes >= 0, positions[np.maximum(codes, 0)], -1)
+
+    def save(self, path):
+        """Persists the cube to a compressed .npz file."""
+        arrays = {'codes': self.codes, 'counts': self.counts}
+        for measure in self.measures:
+            arrays[f'sums__{measure}'] = self.sums[measure]
+        header = {
+            "dimensions": self.dimensions,
+            "measures": self.measures,
+            "integer_sales": bool(self.integer_sales),
+            "labels": {dim: labels.tolist() for dim, labels in self.labels.items()}
+        }
+        arrays['header'] = np.frombuffer(json.dumps(header).encode('utf-8'), dtype='uint8')
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Restores a cube saved with save()."""
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(data['header'].tobytes().decode('utf-8'))
+            cube = cls.__new__(cls)
+            cube.dimensions = header['dimensions']
+            cube.measures = header['measures']
+            cube.integer_sales = header['integer_sales']
+            cube.labels = {dim: pd.Index(labels, name=dim) for dim, labels in header['labels'].items()}
+            cube.codes = data['codes']
+            cube.counts = data['counts']
+            cube.sums = {m: data[f'sums__{m}'] for m in cube.measures}
+        return cube
+
+    def where(self, **filters):
+        """
+        Slice: a new cube with only the cells matching every filter, e.g.
+        where(Region='Europe', Year=[2023, 2024]).
+        """
+        mask = np.ones(self.cell_count, dtype=bool)
+        for dim, values in filters.items():
+            values = values if isinstance(values, (list, tuple, set)) else [values]
+            wanted = self._label_codes(dim, values)
+            mask &= np.isin(self.codes[:, self._axis(dim)], wanted)
+
+        cube = SalesCube.__new__(SalesCube)
+        cube.dimensions = list(self.dimensions)
+        cube.measures = list(self.measures)
+        cube.integer_sales = self.integer_sales
+        cube.labels = dict(self.labels)
+        cube.codes = self.codes[mask]
+        cube.counts = self.counts[mask]
+        cube.sums = {m: values[mask] for m, values in self.sums.items()}
+        return cube
+
+    def rollup(self, dimensions, measure='Sales_Volume'):
+        """
+        Totals of measure (a summed column or 'count') grouped by the given
+        dimensions, over observed combinations in sorted label order.
+        Returns a Series (MultiIndex for several dimensions), or the grand
+        total when dimensions is empty.
+        """
+        if isinstance(dimensions, str):
+            dimensions = [dimensions]
+        values = self._measure_values(measure)
+        if not dimensions:
+            return self._to_measure_dtype(measure, values.sum())
+
+        axes = [self._axis(dim) for dim in dimensions]
+        codes = self.codes[:, axes]
+        valid = (codes >= 0).all(axis=1)
+        codes, values = codes[valid], values[valid]
+
+        sizes = [len(self.labels[dim]) for dim in dimensions]
+        keys = self._cell_keys(codes, sizes)
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        totals = np.bincount(inverse.reshape(-1), weights=values, minlength=len(first))
+        group_codes = codes[first]
+
+        if len(dimensions) == 1:
+            index = self.labels[dimensions[0]][group_codes[:, 0]]
+        else:
+            index = pd.MultiIndex(levels=[self.labels[dim] for dim in dimensions],
+                                  codes=[group_codes[:, i] for i in range(len(dimensions))],
+                                  names=dimensions)
+        return pd.Series(self._to_measure_dtype(measure, totals), index=index, name=measure)
+
+    def pivot(self, row_dim, col_dim, measure='Sales_Volume'):
+        """Two-way rollup as a DataFrame; combinations never observed are 0."""
+        return self.rollup([row_dim, col_dim], measure).unstack(col_dim, fill_value=0)
+
+    def top(self, dimensions, n=5, measure='Sales_Volume'):
+        """The n largest groups of a rollup, largest first."""
+        return self.rollup(dimensions, measure).nlargest(n)
+
+    def _axis(self, dim):
+        if dim not in self.dimensions:
+            raise ValueError(f"Unknown dimension: {dim}. Available: {self.dimensions}")
+        return self.dimensions.index(dim)
+
+    def _label_codes(self, dim, values):
+        labels = self.labels[self.dimensions[self._axis(dim)]]
+        codes = labels.get_indexer(list(values))
+        if (codes < 0).any():
+            unknown = [value for value, code in zip(values, codes) if code < 0]
+            raise ValueError(f"Unknown {dim} values: {unknown}")
+        return codes
+
+    def _measure_values(self, measure):
+        if measure == COUNT:
+            return self.counts.astype('float64')
+        if measure not in self.sums:
+            raise ValueError(f"Unknown measure: {measure}. Available: {self.measures + [COUNT]}")
+        return self.sums[measure]
+
+    def _to_measure_dtype(self, measure, values):
+        """Float sums from np.bincount back to integers for counts and integer sales."""
+        if measure == COUNT or (measure == 'Sales_Volume' and self.integer_sales):
+            return np.rint(values).astype('int64')
+        return values
@@ -1,22 +1,286 @@
+import numpy as np
 import pandas as pd
+import hashlib
+import json
 import os
+from src.catalog import PartitionedDataset, apply_filters, filter_columns
+
+# Dimension columns and their fixed, sorted category sets. Every load, chunk and
+# cache encodes them with the same codes; other values fail validation.
+CATEGORIES = {
+    'Model': ['3 Series', '5 Series', '7 Series', 'M3', 'M5', 'X1', 'X3', 'X5', 'X6', 'i3', 'i8'],
+    'Region': ['Africa', 'Asia', 'Europe', 'Middle East', 'North America', 'South America'],
+    'Color': ['Black', 'Blue', 'Grey', 'Red', 'Silver', 'White'],
+    'Fuel_Type': ['Diesel', 'Electric', 'Hybrid', 'Petrol'],
+    'Transmission': ['Automatic', 'Manual']
+}
+CATEGORICAL_COLUMNS = list(CATEGORIES)
+
+# Numeric columns, stored in the narrowest dtype that holds every value exactly
+# (Year fits int16, Sales_Volume int16, Price_USD and Mileage_KM int32)
+NUMERIC_COLUMNS = ['Year', 'Engine_Size_L', 'Mileage_KM', 'Price_USD', 'Sales_Volume']
+# Their dtypes in written datasets: wide enough for any chunk, so every file of
+# a dataset shares one schema. Reads downcast them again.
+DATASET_DTYPES = {'Year': 'int64', 'Engine_Size_L': 'float64', 'Mileage_KM': 'int64',
+                  'Price_USD': 'int64', 'Sales_Volume': 'int64'}
+INTEGER_DTYPES = ['int8', 'int16', 'int32', 'int64']
+
+# Part of the cache key; bump when the normalized representation changes
+SCHEMA_VERSION = 2
+
+REQUIRED_COLUMNS = ['Model', 'Year', 'Region', 'Price_USD', 'Sales_Volume']
+
+CACHE_SUFFIX = '.cache.parquet'
+CACHE_META_SUFFIX = '.cache.json'
+
+# File extension -> source format
+FORMATS = {
+    '.xlsx': 'excel',
+    '.xlsm': 'excel',
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet'
+}
+
 
 class DataLoader:
-    def __init__(self, file_path):
+    def __init__(self, file_path, use_cache=True, columns=None, filters=None):
+        """
+        file_path: a workbook, CSV or Parquet file, or a directory of
+        Year/Region-partitioned Parquet or CSV files (see src/catalog.py).
+        columns: only load these columns (all by default).
+        filters: only load rows matching every (column, operator, value)
+        filter, e.g. [('Year', '>=', 2023), ('Region', '==', 'Asia')].
+        Partitioned datasets and Parquet files (and the columnar cache) skip
+        the non-matching partitions, row groups and columns while reading.
+        """
         self.file_path = file_path
+        self.use_cache = use_cache
+        self.columns = list(columns) if columns else None
+        self.filters = list(filters) if filters else None
+        self.cache_path = file_path + CACHE_SUFFIX
+        self.cache_meta_path = file_path + CACHE_META_SUFFIX
+        if os.path.isdir(file_path):
+            self.format = 'partitioned'
+        else:
+            self.format = FORMATS.get(os.path.splitext(file_path)[1].lower(), 'excel')
+        if self.format in ('parquet', 'partitioned'):
+            # Already columnar, nothing to gain from a second copy
+            self.use_cache = False
 
     def load_data(self):
-        """Loads the BMW sales data from the Excel file."""
+        """Loads the BMW sales data from the source file (or its columnar cache)."""
         if not os.path.exists(self.file_path):
             raise FileNotFoundError(f"File not found at {self.file_path}")
-        
+
         try:
-            df = pd.read_excel(self.file_path)
-            # Basic validation
-            required_columns = ['Model', 'Year', 'Region', 'Price_USD', 'Sales_Volume']
-            if not all(col in df.columns for col in required_columns):
-                raise ValueError(f"Missing one or more required columns: {required_columns}")
-            
+            source_key = self._source_key() if self.use_cache else None
+            # Cached frames were normalized and validated before they were written
+            df = self._read_cache(source_key) if self.use_cache else None
+            if df is None and self.format in ('parquet', 'partitioned'):
+                # Projection and filters are pushed down into the reader
+                df = self._normalize(self._read_source())
+            elif df is None:
+                df = self._normalize(self._read_source())
+                if self.use_cache:
+                    # The cache holds the whole table, whatever this load selects
+                    self._write_cache(df, source_key)
+                df = self._select(df)
+
+            if self.filters and len(df) == 0:
+                raise ValueError(f"No rows match the filters {self.filters}")
             return df
         except Exception as e:
             raise Exception(f"Error loading data: {e}")
+
+    def iter_chunks(self, chunksize=100000):
+        """
+        Streams the source file as DataFrames of at most chunksize rows, so
+        files larger than memory can be aggregated chunk by chunk
+        (see SalesAggregates.from_chunks). Every chunk is normalized and
+        validated like load_data, so all chunks share the same category codes.
+        """
+        if not os.path.exists(self.file_path):
+            raise FileNotFoundError(f"File not found at {self.file_path}")
+
+        if self.format in ('parquet', 'partitioned'):
+            dataset = PartitionedDataset(self.file_path)
+            for chunk in dataset.iter_batches(chunksize, self.columns, self.filters):
+                yield self._normalize(chunk)
+            return
+
+        readers = {
+            'csv': self._iter_csv_chunks,
+            'excel': self._iter_excel_chunks
+        }
+        for chunk in readers[self.format](chunksize):
+            chunk = self._select(self._normalize(chunk))
+            if len(chunk):
+                yield chunk
+
+    def _read_source(self):
+        if self.format in ('parquet', 'partitioned'):
+            return PartitionedDataset(self.file_path).read(self.columns, self.filters)
+        if self.format == 'csv':
+            return pd.read_csv(self.file_path, usecols=self._read_columns())
+        return pd.read_excel(self.file_path, usecols=self._read_columns())
+
+    def _read_columns(self):
+        """Columns to read from a CSV or workbook: the projection plus the filtered columns."""
+        if self.columns is None:
+            return None
+        return list(dict.fromkeys(self.columns + filter_columns(self.filters)))
+
+    def _select(self, df):
+        """Applies the filters and the projection in memory (sources without pushdown)."""
+        df = apply_filters(df, self.filters)
+        if self.columns is not None:
+            df = df[self.columns]
+        return df
+
+    def _iter_csv_chunks(self, chunksize):
+        with pd.read_csv(self.file_path, chunksize=chunksize, usecols=self._read_columns()) as reader:
+            for chunk in reader:
+                yield chunk
+
+    def _iter_excel_chunks(self, chunksize):
+        from openpyxl import load_workbook
+
+        # read_only mode streams rows instead of building the whole sheet
+        workbook = load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [str(name) for name in header]
+            batch = []
+            for row in rows:
+                if all(value is None for value in row):
+                    continue
+                batch.append(row)
+                if len(batch) >= chunksize:
+                    yield pd.DataFrame.from_records(batch, columns=columns)
+                    batch = []
+            if batch:
+                yield pd.DataFrame.from_records(batch, columns=columns)
+        finally:
+            workbook.close()
+
+    def _validate_columns(self, df):
+        # A projection only needs the required columns it asked for
+        required = [col for col in REQUIRED_COLUMNS if self.columns is None or col in self.columns]
+        if not all(col in df.columns for col in required):
+            raise ValueError(f"Missing one or more required columns: {required}")
+
+    def _normalize(self, df):
+        """
+        Validates the schema and converts each column to its compact form in one
+        pass: dimension columns to categoricals with the fixed CATEGORIES,
+        numeric columns to the narrowest dtype that is lossless for this data.
+        """
+        self._validate_columns(df)
+        for col, categories in CATEGORIES.items():
+            if col in df.columns:
+                df[col] = self._to_categorical(df[col], categories)
+        for col in NUMERIC_COLUMNS:
+            if col in df.columns:
+                df[col] = self._downcast(df[col])
+        return df
+
+    def _to_categorical(self, column, categories):
+        if isinstance(column.dtype, pd.CategoricalDtype) and list(column.cat.categories) == categories:
+            return column
+        encoded = pd.Categorical(column, categories=categories)
+        unexpected = (encoded.codes == -1) & column.notna().to_numpy()
+        if unexpected.any():
+            values = sorted(map(str, pd.unique(column[unexpected])))
+            raise ValueError(f"Unexpected values in column {column.name}: {values[:10]}")
+        return pd.Series(encoded, index=column.index, name=column.name)
+
+    def _downcast(self, column):
+        try:
+            values = pd.to_numeric(column).to_numpy()
+        except (TypeError, ValueError):
+            raise ValueError(f"Column {column.name} is not numeric")
+
+        if values.dtype.kind == 'f':
+            if not np.isfinite(values).all():
+                # Missing values need a float dtype
+                return pd.Series(values, index=column.index, name=column.name)
+            if not np.array_equal(values, np.trunc(values)):
+                # Fractional: float32 only if it round-trips exactly (it does not for 3.1)
+                narrow = values.astype('float32')
+                if np.array_equal(narrow.astype(values.dtype), values):
+                    values = narrow
+                return pd.Series(values, index=column.index, name=column.name)
+
+        if len(values) and values.dtype.kind in 'iuf':
+            low, high = values.min(), values.max()
+            for dtype in INTEGER_DTYPES:
+                info = np.iinfo(dtype)
+                if info.min <= low and high <= info.max:
+                    values = values.astype(dtype)
+                    break
+        return pd.Series(values, index=column.index, name=column.name)
+
+    def _source_key(self):
+        """Identifies the current version of the source file."""
+        stat = os.stat(self.file_path)
+        sha256 = hashlib.sha256()
+        with open(self.file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha256.update(block)
+        return {
+            "schema": SCHEMA_VERSION,
+            "path": os.path.abspath(self.file_path),
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha256": sha256.hexdigest()
+        }
+
+    def _read_cache(self, source_key):
+        """Returns the cached DataFrame, or None if the cache is missing or stale."""
+        if not (os.path.exists(self.cache_path) and os.path.exists(self.cache_meta_path)):
+            return None
+
+        try:
+            with open(self.cache_meta_path, 'r', encoding='utf-8') as f:
+                cached_key = json.load(f)
+        except (OSError, ValueError):
+            cached_key = None
+
+        if cached_key != source_key:
+            # Workbook changed since the cache was written
+            self._remove_cache()
+            return None
+
+        try:
+            return pd.read_parquet(self.cache_path, columns=self.columns, filters=self.filters)
+        except ImportError:
+            # No Parquet engine installed, fall back to the workbook
+            return None
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable data cache: {e}")
+            self._remove_cache()
+            return None
+
+    def _write_cache(self, df, source_key):
+        """Writes the DataFrame next to the source file in Parquet format."""
+        try:
+            df.to_parquet(self.cache_path, index=False)
+        except ImportError:
+            return
+        except Exception as e:
+            print(f"Warning: Could not write data cache: {e}")
+            self._remove_cache()
+            return
+
+        # Metadata is written last so a partial cache is never considered valid
+        with open(self.cache_meta_path, 'w', encoding='utf-8') as f:
+            json.dump(source_key, f)
+
+    def _remove_cache(self):
+        for path in (self.cache_path, self.cache_meta_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -1,5 +1,81 @@
+import codecs
+import fnmatch
+import gzip
+import json
 import os
-import re
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+
+# Sections expected as h2/h3 headers (Executive Summary, Sales Trends, etc.)
+REQUIRED_SECTIONS = [
+    "Executive Summary",
+    "Sales Trends",
+    "Regional",
+    "Mobility",
+    "Key Drivers",
+    "Recommendations"
+]
+
+# Bytes read per step; the parser only ever holds about this much of the report
+READ_CHUNK_SIZE = 64 * 1024
+
+# Header text kept per header, enough for any real title
+MAX_HEADER_TEXT = 1024
+
+# Unparsed script/style text kept between chunks, enough for a split end tag
+CDATA_TAIL = 64
+
+
+def evaluate_report(report_path):
+    """Module-level so batch evaluation can run on a process pool."""
+    return ReportEvaluator(report_path).evaluate()
+
+
+class _ReportScanner(HTMLParser):
+    """Collects every evaluation criterion in a single pass over the report."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.has_h1_title = False
+        self.sections_found = set()
+        self.plot_count = 0
+        self._header_tag = None
+        self._header_text = []
+
+    def feed(self, data):
+        super().feed(data)
+        # HTMLParser buffers a script/style body until its end tag arrives (all
+        # of an inlined plotly.js). The body is never needed here, so keep only
+        # enough of it to recognize an end tag split across chunks.
+        if self.cdata_elem and len(self.rawdata) > CDATA_TAIL:
+            self.rawdata = self.rawdata[-CDATA_TAIL:]
+
+    def handle_starttag(self, tag, attrs):
+        classes = dict(attrs).get('class') or ''
+        if 'plotly-graph-div' in classes.split():
+            self.plot_count += 1
+        if tag in ('h1', 'h2', 'h3') and self._header_tag is None:
+            self._header_tag = tag
+            self._header_text = []
+
+    def handle_endtag(self, tag):
+        if tag != self._header_tag:
+            return
+        text = "".join(self._header_text).lower()
+        if tag == 'h1':
+            bmw = text.find('bmw')
+            if bmw >= 0 and text.find('report', bmw) >= 0:
+                self.has_h1_title = True
+        else:
+            for section in REQUIRED_SECTIONS:
+                if section.lower() in text:
+                    self.sections_found.add(section)
+        self._header_tag = None
+
+    def handle_data(self, data):
+        if self._header_tag is not None and sum(map(len, self._header_text)) < MAX_HEADER_TEXT:
+            self._header_text.append(data)
+
 
 class ReportEvaluator:
     def __init__(self, report_path='output/Interactive_Report.html'):
@@ -9,6 +85,9 @@ class ReportEvaluator:
         """
         Evaluates the generated report for completeness and correctness.
         Returns a dictionary of evaluation results.
+
+        The report (.html or .html.gz) is streamed through an incremental HTML
+        parser, so memory use does not grow with the report size.
         """
         results = {
             "file_exists": False,
@@ -24,41 +103,30 @@ class ReportEvaluator:
             return results
 
         results["file_exists"] = True
-        
-        # Check file size (should be > 1KB)
-        file_size = os.path.getsize(self.report_path)
+
+        scanner = _ReportScanner()
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        file_size = 0
+        opener = gzip.open if self.report_path.endswith('.gz') else open
+        with opener(self.report_path, 'rb') as f:
+            for block in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+                file_size += len(block)
+                scanner.feed(decoder.decode(block))
+        scanner.feed(decoder.decode(b'', final=True))
+        scanner.close()
+
+        # Check file size (should be > 1KB, uncompressed)
         if file_size > 1024:
             results["file_size_ok"] = True
 
-        with open(self.report_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Check H1
-        if re.search(r'<h1.*?>.*?BMW.*?Report.*?</h1>', content, re.IGNORECASE):
-            results["has_h1_title"] = True
-
-        # Check Sections (Executive Summary, Sales Trends, etc.)
-        required_sections = [
-            "Executive Summary",
-            "Sales Trends",
-            "Regional",
-            "Mobility",
-            "Key Drivers",
-            "Recommendations"
-        ]
-        
-        sections_found = 0
-        for section in required_sections:
-            if re.search(rf'<h[23].*?>.*?{section}.*?</h[23]>', content, re.IGNORECASE):
-                sections_found += 1
-        
-        if sections_found >= len(required_sections) - 1: # Allow 1 missing
+        results["has_h1_title"] = scanner.has_h1_title
+
+        if len(scanner.sections_found) >= len(REQUIRED_SECTIONS) - 1: # Allow 1 missing
             results["has_sections"] = True
 
         # Check Plots
         # We expect at least 5 plots (yearly, regional, models, fuel, transmission, price/correlation, color)
-        plot_count = len(re.findall(r'class="plotly-graph-div"', content))
-        if plot_count >= 5:
+        if scanner.plot_count >= 5:
             results["has_plots"] = True
 
         # Calculate Score (Simple)
@@ -68,11 +136,58 @@ class ReportEvaluator:
         if results["has_h1_title"]: score += 10
         if results["has_sections"]: score += 25
         if results["has_plots"]: score += 25
-        
+
         results["score"] = score
-        
+
         return results
 
+    @staticmethod
+    def evaluate_many(report_paths, workers=None, summary_path=None):
+        """
+        Evaluates many reports in parallel on a process pool and returns a
+        summary dict; written as JSON to summary_path when given.
+        """
+        report_paths = sorted(report_paths)
+        if workers == 1 or len(report_paths) <= 1:
+            results = [evaluate_report(path) for path in report_paths]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(evaluate_report, report_paths, chunksize=8))
+
+        reports = dict(zip(report_paths, results))
+        scores = [result["score"] for result in results]
+        summary = {
+            "report_count": len(reports),
+            "mean_score": sum(scores) / len(scores) if scores else None,
+            "min_score": min(scores) if scores else None,
+            "below_full_score": [path for path, result in reports.items() if result["score"] < 100],
+            "reports": reports
+        }
+
+        if summary_path:
+            with open(summary_path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2)
+
+        return summary
+
+    @staticmethod
+    def evaluate_directory(directory, patterns=('*.html', '*.html.gz'), exclude=('index.html', 'index.html.gz'),
+                           workers=None, summary_path=None):
+        """
+        Evaluates every report in directory matching patterns (see evaluate_many).
+        A .html.gz copy is skipped when the uncompressed report is also present.
+        """
+        names = {
+            name for name in os.listdir(directory)
+            if any(fnmatch.fnmatch(name, pattern) for pattern in patterns) and name not in exclude
+        }
+        report_paths = [
+            os.path.join(directory, name)
+            for name in names
+            if not (name.endswith('.gz') and name[:-3] in names)
+        ]
+        return ReportEvaluator.evaluate_many(report_paths, workers=workers, summary_path=summary_path)
+
     def print_report(self):
         results = self.evaluate()
         print("\n" + "="*50)
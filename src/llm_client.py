@@ -1,45 +1,26 @@
+import asyncio
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+import re
+import time
+from src.cache import content_hash
+from src.llm_transport import ResilientTransport
 
-class LLMClient:
-    def __init__(self):
-        load_dotenv()
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY not found in environment variables.")
-        
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+MODEL_NAME = 'gemini-2.0-flash'
 
-    def generate_report_content(self, summary_stats):
-        """
-        Generates a narrative report based on the provided summary statistics.
-        """
-        prompt = self._construct_prompt(summary_stats)
-        
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            print(f"Error calling Gemini API: {e}")
-            return "Error: Could not generate AI report content. Please check API key and quota."
-
-    def _construct_prompt(self, stats):
-        return f"""
+PROMPT_TEMPLATE = """
         You are a senior data analyst at BMW. Write a comprehensive executive report based on the following sales data analysis.
-        
+
         ### Data Summary:
-        - **Total Sales Volume**: {stats['total_sales']}
-        - **Yearly Trend**: {stats['yearly_trend']}
-        - **Top Performing Region**: {stats['top_region']} with {stats['top_region_sales']} sales
-        - **Top 5 Models**: {stats['top_models']}
-        - **Fuel Type Trends**: {stats['fuel_trends']}
-        - **Transmission Split**: {stats['transmission_split']}
-        - **Price Segments (Volume by Range)**: {stats['price_segments']}
-        - **Color Preferences**: {stats['color_sales']}
-        - **Correlations**: {stats['correlations']}
-        - **Fuel Preference by Price Segment**: {stats['fuel_by_segment']}
+        - **Total Sales Volume**: {total_sales}
+        - **Yearly Trend**: {yearly_trend}
+        - **Top Performing Region**: {top_region} with {top_region_sales} sales
+        - **Top 5 Models**: {top_models}
+        - **Fuel Type Trends**: {fuel_trends}
+        - **Transmission Split**: {transmission_split}
+        - **Price Segments (Volume by Range)**: {price_segments}
+        - **Color Preferences**: {color_sales}
+        - **Correlations**: {correlations}
+        - **Fuel Preference by Price Segment**: {fuel_by_segment}
 
         ### Requirements:
         1. **Executive Summary**: Brief overview of the key findings.
@@ -59,3 +40,264 @@ class LLMClient:
         -   Do not include any code blocks or raw JSON.
         -   Focus on business value and actionable insights.
         """
+
+SECTION_PROMPT_TEMPLATE = """You are a senior data analyst at BMW. Write the "{title}" section of an executive report on BMW sales data.
+
+Data (tables are |-separated; the first row holds the column names):
+{data}
+
+Task: {instruction}
+
+Write only the body of this section in Markdown: no title, no headers (the section header is added for you), no code blocks or raw JSON. Focus on business value and actionable insights.
+"""
+
+# Summary stats key -> label used in the section prompts
+STAT_LABELS = {
+    'total_sales': 'Total Sales Volume',
+    'yearly_trend': 'Yearly Trend',
+    'top_region': 'Top Performing Region',
+    'top_region_sales': 'Top Region Sales',
+    'top_models': 'Top 5 Models',
+    'fuel_trends': 'Fuel Type Trends (by year)',
+    'transmission_split': 'Transmission Split',
+    'price_segments': 'Price Segments (Volume by Range)',
+    'color_sales': 'Color Preferences',
+    'correlations': 'Correlations with Sales Volume',
+    'fuel_by_segment': 'Fuel Preference by Price Segment'
+}
+
+# Report sections in order: (header, task, stats keys in the prompt or None for all).
+# The headers carry the keywords ReportGenerator and ReportEvaluator look for.
+SECTIONS = [
+    ("Executive Summary", "Give a brief overview of the key findings.",
+     ['total_sales', 'yearly_trend', 'top_region', 'top_region_sales', 'top_models', 'fuel_trends', 'price_segments']),
+    ("Sales Trends", "Analyze the performance over the years.",
+     ['total_sales', 'yearly_trend']),
+    ("Regional & Model Performance", "Highlight top markets and models.",
+     ['total_sales', 'top_region', 'top_region_sales', 'top_models']),
+    ("Mobility Trends (Fuel & Transmission)",
+     "Analyze the shift in fuel preferences (e.g., EV/Hybrid growth) and transmission types.",
+     ['fuel_trends', 'transmission_split']),
+    ("Key Drivers of Sales",
+     "Analyze price sensitivity (which price segments drive the most volume) and aesthetic preferences "
+     "(which colors are most popular). Mention the statistical correlations as supporting evidence.",
+     ['price_segments', 'color_sales', 'correlations']),
+    ("Strategic Recommendations", "Provide actionable business advice based on the data.", None),
+    ("Additional Insight",
+     "Provide one specific, data-driven insight beyond the yearly, regional, model, fuel, transmission, "
+     "price and color overviews. Look for deeper patterns (e.g., fuel type preference changes in specific "
+     "price segments).", None)
+]
+
+# First line of every section of the template narrative used when the LLM is unavailable
+FALLBACK_NOTE = "_The AI service was unavailable, so this section only lists the underlying figures._"
+
+# A header the model added despite the instructions; the stitched report has its own
+LEADING_HEADER = re.compile(r'\A\s*#{1,6}[^\n]*\n')
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return f"{value:.3g}"
+    return str(value)
+
+
+def format_table(value):
+    """
+    Encodes a stats value compactly: scalars as is, a flat dict as one
+    `key|value` row per item, and a dict of dicts as a table with one row
+    per inner key and one column per outer key (e.g. years x fuel types).
+    """
+    if not isinstance(value, dict):
+        return format_value(value)
+    if not any(isinstance(v, dict) for v in value.values()):
+        return "\n".join(f"{k}|{format_value(v)}" for k, v in value.items())
+
+    columns = list(value)
+    rows = list(dict.fromkeys(k for inner in value.values() for k in inner))
+    lines = ["|" + "|".join(str(c) for c in columns)]
+    for row in rows:
+        lines.append(f"{row}|" + "|".join(format_value(value[c].get(row, '')) for c in columns))
+    return "\n".join(lines)
+
+
+def format_inline(value):
+    """One-line form of a stats value for the template narrative."""
+    if isinstance(value, dict):
+        items = [f"{k}: ({format_inline(v)})" if isinstance(v, dict) else f"{k}: {format_inline(v)}"
+                 for k, v in value.items()]
+        return "; ".join(items)
+    if isinstance(value, int):
+        return f"{value:,}"
+    return format_value(value)
+
+
+def template_section(section, stats):
+    """Body of a section built from the stats alone, without the LLM."""
+    _, _, keys = section
+    if not keys:
+        return "_The AI service was unavailable, so this section could not be written._"
+    lines = [FALLBACK_NOTE, ""]
+    lines.extend(f"- **{STAT_LABELS[key]}**: {format_inline(stats[key])}" for key in keys)
+    return "\n".join(lines)
+
+
+def stitch_sections(bodies):
+    """Joins section bodies, in SECTIONS order, under their ## headers."""
+    parts = []
+    for (title, _, _), body in zip(SECTIONS, bodies):
+        parts.append(f"## {title}\n\n{LEADING_HEADER.sub('', body).strip()}\n")
+    return "\n".join(parts)
+
+
+class LLMClient:
+    def __init__(self, model=None, cache=None, refresh_cache=False, sectioned=False, transport=None,
+                 api_endpoint=None):
+        """
+        model: optional object with the GenerativeModel interface
+        (generate_content), e.g. a stub for local testing.
+        cache: optional DiskCache for responses; refresh_cache ignores existing
+        entries but still stores the new response.
+        sectioned: request each report section with its own smaller prompt,
+        all at once, and stitch the sections together in order.
+        transport: ResilientTransport with the timeout, retry, hedging and
+        circuit breaker settings (defaults if None).
+        api_endpoint: talk to this host (e.g. http://127.0.0.1:8765, a fake
+        server) over REST instead of the Gemini API; also read from
+        GEMINI_API_ENDPOINT.
+        """
+        self.cache = cache
+        self.refresh_cache = refresh_cache
+        self.sectioned = sectioned
+        self.transport = transport or ResilientTransport()
+        # One entry per request: latency, prompt/response size and token counts
+        self.calls = []
+        self._model = model
+        if model is not None:
+            return
+
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        self.api_key = os.getenv("GOOGLE_API_KEY")
+        self.api_endpoint = api_endpoint or os.getenv("GEMINI_API_ENDPOINT")
+        if not self.api_key:
+            raise ValueError("GOOGLE_API_KEY not found in environment variables.")
+
+    @property
+    def model(self):
+        """
+        The Gemini model, created on first use: google.generativeai is slow to
+        import and is not needed at all when every response comes from the cache.
+        """
+        if self._model is None:
+            import google.generativeai as genai
+
+            if self.api_endpoint:
+                genai.configure(api_key=self.api_key, transport='rest',
+                                client_options={"api_endpoint": self.api_endpoint})
+            else:
+                genai.configure(api_key=self.api_key)
+            self._model = genai.GenerativeModel(MODEL_NAME)
+        return self._model
+
+    def generate_report_content(self, summary_stats):
+        """
+        Generates a narrative report based on the provided summary statistics.
+        Blocking variant of generate_report_content_async; not for use inside
+        a running event loop.
+        """
+        return asyncio.run(self.generate_report_content_async(summary_stats))
+
+    async def generate_report_content_async(self, summary_stats, on_token=None):
+        """
+        Generates the narrative: on_token is called with the text of each
+        response once it is complete (in sectioned mode, once per section, in
+        the order the sections finish). A retried request only passes on the
+        text of the attempt that succeeded.
+
+        If the LLM cannot be reached in time, an expired cached response or
+        else a template narrative built from the stats is returned instead.
+        """
+        if self.sectioned:
+            bodies = await asyncio.gather(*(self._generate_section(section, summary_stats, on_token)
+                                            for section in SECTIONS))
+            return stitch_sections(bodies)
+
+        prompt = self._construct_prompt(summary_stats)
+        return await self._generate(prompt, self._cache_key(summary_stats), on_token,
+                                    lambda: stitch_sections([template_section(section, summary_stats)
+                                                             for section in SECTIONS]))
+
+    async def _generate_section(self, section, summary_stats, on_token):
+        prompt = self._construct_section_prompt(section, summary_stats)
+        return await self._generate(prompt, content_hash(MODEL_NAME, prompt), on_token,
+                                    lambda: template_section(section, summary_stats), section=section[0])
+
+    async def _generate(self, prompt, cache_key, on_token, template, section=None):
+        """Cached response, else a call through the transport, else the fallback."""
+        start = time.perf_counter()
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            self._record_call(start, None, "", cached, None, cached=True, section=section)
+            if on_token:
+                on_token(cached)
+            return cached
+
+        try:
+            text, usage, first_token = await self.transport.generate(self.model, prompt, on_token)
+            self._record_call(start, first_token, prompt, text, usage, section=section)
+            self._store_response(cache_key, text)
+            return text
+        except Exception as e:
+            label = f" ({section})" if section else ""
+            print(f"Error calling Gemini API{label}: {e}")
+            text = self.cache.get(cache_key, allow_expired=True) if self.cache is not None else None
+            fallback = 'expired cache' if text is not None else 'template'
+            if text is None:
+                text = template()
+            print(f"Using the {fallback} narrative{label} instead.")
+            self._record_call(start, None, prompt, text, None, section=section, fallback=fallback)
+            if on_token:
+                on_token(text)
+            return text
+
+    def _cache_key(self, summary_stats):
+        """Identifies a response by model, prompt template and canonicalized stats."""
+        return content_hash(MODEL_NAME, PROMPT_TEMPLATE, summary_stats)
+
+    def _cached_response(self, cache_key):
+        if self.cache is None or self.refresh_cache:
+            return None
+        return self.cache.get(cache_key)
+
+    def _store_response(self, cache_key, text):
+        if self.cache is not None and text:
+            self.cache.set(cache_key, text)
+
+    def _record_call(self, start, first_token, prompt, text, usage, cached=False, section=None, fallback=None):
+        self.calls.append({
+            "section": section,
+            "start": start,
+            "latency_s": time.perf_counter() - start,
+            "first_token_s": first_token - start if first_token is not None else None,
+            "cached": cached,
+            "fallback": fallback,
+            "prompt_chars": len(prompt),
+            "response_chars": len(text),
+            "prompt_tokens": getattr(usage, 'prompt_token_count', None),
+            "response_tokens": getattr(usage, 'candidates_token_count', None),
+            "total_tokens": getattr(usage, 'total_token_count', None)
+        })
+
+    def _construct_prompt(self, stats):
+        return PROMPT_TEMPLATE.format(**stats)
+
+    def _construct_section_prompt(self, section, stats):
+        title, instruction, keys = section
+        data = []
+        for key in keys or STAT_LABELS:
+            table = format_table(stats[key])
+            separator = "\n" if "\n" in table else " "
+            data.append(f"{STAT_LABELS[key]}:{separator}{table}")
+        return SECTION_PROMPT_TEMPLATE.format(title=title, data="\n".join(data), instruction=instruction)
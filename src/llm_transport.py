@@ -0,0 +1,277 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# HTTP statuses worth retrying: rate limited, or a transient server-side failure
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the model while the circuit breaker is open."""
+
+
+def status_code(error):
+    """HTTP status of an API error (google.api_core or requests exceptions), or None."""
+    code = getattr(error, 'code', None)
+    if code is None or callable(code):
+        response = getattr(error, 'response', None)
+        code = getattr(response, 'status_code', None)
+    try:
+        return int(code)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """Timeouts, connection failures (OSError, incl. requests errors) and 429/5xx responses."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, OSError)):
+        return True
+    return status_code(error) in RETRYABLE_STATUS
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failed attempts. While open,
+    calls fail fast; after reset_timeout seconds exactly one trial call is let
+    through (half-open) while the others keep failing fast. The trial closes
+    the breaker again on success and reopens it on failure.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # Caller token of the trial call in flight in the half-open state
+        self._trial = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self, caller=None):
+        """
+        Whether a call may go ahead. In the half-open state only the first
+        caller is let through, and the same caller again for its retries.
+        """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and (self._trial is None or self._trial is caller):
+                self._trial = caller if caller is not None else object()
+                return True
+            return False
+
+    def end_trial(self, caller):
+        """Frees the trial slot if caller holds it and ended without success or failure."""
+        with self._lock:
+            if self._trial is caller:
+                self._trial = None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = None
+
+    def record_failure(self):
+        with self._lock:
+            self._trial = None
+            self.failures += 1
+            # A failed trial call in the half-open state reopens immediately
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Latencies of the most recent successful attempts, for the hedging delay."""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+class ResilientTransport:
+    """
+    Calls the model with a deadline per attempt and per call, retries
+    timeouts, connection errors and 429/5xx responses with jittered
+    exponential backoff, and stops calling a failing service via a circuit
+    breaker. With hedge, a duplicate request is started once an attempt runs
+    longer than the p95 latency of recent calls, and the first answer wins.
+
+    Each attempt streams the response on a worker thread (the SDK's own async
+    client cannot be interrupted on the REST transport), so a hung request
+    never blocks the event loop and is abandoned at its deadline. One
+    transport, and with it the model's HTTP/gRPC session, is shared by every
+    call of an LLMClient, e.g. across a whole batch run.
+    """
+
+    def __init__(self, timeout=60, deadline=180, max_retries=3, backoff_base=1.0, backoff_max=30.0,
+                 hedge=False, hedge_min_samples=20, breaker=None, max_workers=32, limiter=None):
+        """
+        timeout: seconds per attempt; deadline: seconds per call, retries included.
+        hedge_min_samples: successful calls needed before the p95 is trusted.
+        limiter: optional object with a run(coro_fn, *args) coroutine, e.g. a
+        batch.RateLimitedScheduler, that every request goes through (retries
+        and hedges included); time spent waiting for it is not part of timeout.
+        """
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter
+        self.latency = LatencyTracker()
+        self.stats = {"attempts": 0, "retries": 0, "timeouts": 0, "hedges": 0, "hedge_wins": 0, "rejected": 0}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm')
+
+    async def generate(self, model, prompt, on_token=None):
+        """
+        Returns (text, usage_metadata, first token time) for prompt. Raises the
+        last error once retries or the deadline are exhausted, or
+        CircuitOpenError while the breaker is open.
+
+        Attempts are buffered: on_token gets the text of the attempt that
+        succeeded, so a retried partial response is never passed on twice.
+        """
+        call = object()
+        if not self.breaker.allow(call):
+            self.stats["rejected"] += 1
+            raise CircuitOpenError("LLM circuit breaker is open after repeated failures.")
+
+        try:
+            deadline = time.monotonic() + self.deadline
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    result = await self._hedged_attempt(model, prompt, min(self.timeout, remaining), on_token)
+                    self.breaker.record_success()
+                    return result
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    self.breaker.record_failure()
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.stats["timeouts"] += 1
+                    # Full jitter: spreads out the retries of concurrent calls
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                    attempt += 1
+                    if (attempt > self.max_retries or not self.breaker.allow(call)
+                            or time.monotonic() + delay >= deadline):
+                        raise
+                    print(f"LLM request failed ({e!r}); retry {attempt}/{self.max_retries} in {delay:.1f} s")
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(delay)
+        finally:
+            # A trial call that ended otherwise (non-retryable error, cancelled) lets the next caller try
+            self.breaker.end_trial(call)
+
+    async def _hedged_attempt(self, model, prompt, timeout, on_token):
+        hedge_after = None
+        if self.hedge and len(self.latency.samples) >= self.hedge_min_samples:
+            hedge_after = self.latency.percentile(95)
+        if hedge_after is None or hedge_after >= timeout:
+            return self._emit(await self._attempt(model, prompt, timeout), on_token)
+
+        # Only the winner's text reaches on_token
+        start = time.monotonic()
+        primary = asyncio.ensure_future(self._attempt(model, prompt, timeout))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if primary in done:
+            return self._emit(primary.result(), on_token)
+
+        self.stats["hedges"] += 1
+        hedge = asyncio.ensure_future(self._attempt(model, prompt, timeout - (time.monotonic() - start)))
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if task is hedge:
+                        self.stats["hedge_wins"] += 1
+                    return self._emit(task.result(), on_token)
+                error = task.exception()
+        raise error
+
+    @staticmethod
+    def _emit(result, on_token):
+        if on_token and result[0]:
+            on_token(result[0])
+        return result
+
+    async def _attempt(self, model, prompt, timeout):
+        if self.limiter is None:
+            return await self._request(model, prompt, timeout)
+        return await self.limiter.run(self._request, model, prompt, timeout)
+
+    async def _request(self, model, prompt, timeout):
+        """
+        One streamed request on a worker thread, abandoned after timeout
+        seconds. Streaming records the first token time and lets an abandoned
+        request stop reading.
+        """
+        if timeout <= 0:
+            raise asyncio.TimeoutError()
+        self.stats["attempts"] += 1
+        loop = asyncio.get_running_loop()
+        abandoned = threading.Event()
+
+        def run():
+            start = time.perf_counter()
+            # retry=None: the SDK's own retries would run on past our deadline
+            response = model.generate_content(prompt, stream=True,
+                                              request_options={"timeout": timeout, "retry": None})
+            chunks = []
+            first_token = None
+            usage = None
+            for chunk in response:
+                if abandoned.is_set():
+                    break
+                # The last chunk carries the usage totals for the whole response
+                usage = getattr(chunk, 'usage_metadata', None) or usage
+                text = chunk_text(chunk)
+                if not text:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter()
+                chunks.append(text)
+            self.latency.add(time.perf_counter() - start)
+            return "".join(chunks), usage, first_token
+
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self._executor, run), timeout)
+        except BaseException:
+            abandoned.set()
+            raise
+
+
+def chunk_text(chunk):
+    # .text raises on chunks without text parts (e.g. the final safety/usage chunk)
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
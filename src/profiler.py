@@ -0,0 +1,213 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is then left out
+    resource = None
+
+# Chrome trace thread ids, one row per kind of event
+TRACE_THREADS = {"stage": (1, "Pipeline"), "plot": (2, "Plots"), "llm": (3, "LLM")}
+
+
+# Running tracemalloc peak of every open traced_peak() section, innermost last
+_memory_peaks = []
+
+
+@contextmanager
+def traced_peak():
+    """
+    Measures the tracemalloc peak of the enclosed block, available as
+    result["bytes"] of the yielded dict once the block exits. The peak is
+    reset on entry, and the part before it still counts for the sections
+    around it, so stages and the plots within them can each have their own
+    peak. Sections must nest; they must not overlap on different threads.
+    """
+    result = {"bytes": None}
+    current_peak = tracemalloc.get_traced_memory()[1]
+    if _memory_peaks:
+        _memory_peaks[-1] = max(_memory_peaks[-1], current_peak)
+    if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+        tracemalloc.reset_peak()
+    _memory_peaks.append(0)
+    try:
+        yield result
+    finally:
+        peak = max(_memory_peaks.pop(), tracemalloc.get_traced_memory()[1])
+        if _memory_peaks:
+            # An inner section's peak also counts for the section around it
+            _memory_peaks[-1] = max(_memory_peaks[-1], peak)
+        result["bytes"] = peak
+
+
+def peak_rss_bytes():
+    """
+    Peak resident set size of the whole process so far, or None where
+    unavailable. It never goes down, so a stage only raises it if it set a new high.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class PipelineProfiler:
+    """
+    Records wall time, CPU time, memory and input/output sizes for each pipeline
+    stage, plus per-plot timings and LLM calls, and saves them as a JSON or
+    Chrome trace (chrome://tracing, Perfetto).
+
+    trace_memory turns on tracemalloc to report the peak of Python allocations
+    per stage and per plot (it slows allocation-heavy code). The process-wide
+    peak RSS so far is always recorded at the end of each stage. Stages named
+    in cprofile_stages also get a cProfile dump ({profile_dir}/{stage}.prof,
+    readable with pstats or snakeviz).
+    """
+
+    def __init__(self, trace_memory=False, cprofile_stages=(), profile_dir='output/profile'):
+        self.trace_memory = trace_memory
+        self.cprofile_stages = set(cprofile_stages)
+        self.profile_dir = profile_dir
+        self.events = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, **info):
+        """
+        Measures the enclosed block as stage `name`. Yields the stage's info
+        dict so the block can add sizes (rows, bytes, ...) once known.
+
+        Stages may nest but must not overlap on different threads, and cProfile
+        only sees the thread that entered the stage.
+        """
+        event = {"name": name, "cat": "stage", "info": dict(info)}
+        profile = cProfile.Profile() if name in self.cprofile_stages else None
+
+        memory = None
+        try:
+            with (traced_peak() if self.trace_memory else nullcontext()) as memory:
+                start = time.perf_counter()
+                cpu_start = time.process_time()
+                if profile is not None:
+                    profile.enable()
+                try:
+                    yield event["info"]
+                finally:
+                    if profile is not None:
+                        profile.disable()
+                    event["start_s"] = start - self._origin
+                    event["wall_s"] = time.perf_counter() - start
+                    event["cpu_s"] = time.process_time() - cpu_start
+        finally:
+            if memory is not None:
+                event["tracemalloc_peak_bytes"] = memory["bytes"]
+            event["process_peak_rss_bytes"] = peak_rss_bytes()
+            if profile is not None:
+                event["cprofile"] = self._dump_profile(profile, name)
+            self._add(event)
+
+    def add_plot_timings(self, plot_timings):
+        """Adds BMWVisualizer.plot_timings ({plot_key: timing dict}) as plot events."""
+        for key, timing in plot_timings.items():
+            event = {
+                "name": key,
+                "cat": "plot",
+                "start_s": timing["start"] - self._origin,
+                "wall_s": timing["wall_s"],
+                "cpu_s": timing["cpu_s"],
+                "info": {"output_chars": timing.get("output_chars"), "cached": bool(timing.get("cached"))}
+            }
+            if timing.get("tracemalloc_peak_bytes") is not None:
+                event["tracemalloc_peak_bytes"] = timing["tracemalloc_peak_bytes"]
+            self._add(event)
+
+    def add_llm_calls(self, calls):
+        """Adds LLMClient.calls (latency, token counts) as LLM events."""
+        for call in calls:
+            info = {k: v for k, v in call.items() if k not in ("start", "latency_s")}
+            name = "cached response" if call.get("cached") else \
+                f"{call['fallback']} fallback" if call.get("fallback") else "generate_content"
+            self._add({
+                "name": f"{name}: {call['section']}" if call.get("section") else name,
+                "cat": "llm",
+                "start_s": call["start"] - self._origin,
+                "wall_s": call["latency_s"],
+                "info": info
+            })
+
+    def save(self, path, trace_format='json'):
+        """Writes the events as a plain JSON report or, with trace_format='chrome', a Chrome trace."""
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        events = sorted(self.events, key=lambda e: e["start_s"])
+        if trace_format == 'chrome':
+            payload = {"traceEvents": self._chrome_events(events), "displayTimeUnit": "ms"}
+        else:
+            payload = {"wall_s": time.perf_counter() - self._origin, "events": events}
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, indent=2, default=str)
+        return path
+
+    def print_summary(self):
+        print("\n" + "="*50)
+        print("PIPELINE PROFILE")
+        print("="*50)
+        print(f"{'Stage':<36}{'Wall (s)':>10}{'CPU (s)':>10}{'Cached':>8}"
+              + (f"{'Peak MiB':>10}" if self.trace_memory else ""))
+        for event in sorted(self.events, key=lambda e: e["start_s"]):
+            label = event["name"] if event["cat"] == "stage" else f"  {event['cat']}: {event['name']}"
+            cpu = f"{event['cpu_s']:>10.3f}" if "cpu_s" in event else f"{'':>10}"
+            cached = f"{'yes' if event['info'].get('cached') else '':>8}"
+            peak = event.get("tracemalloc_peak_bytes")
+            memory = f"{peak / 2**20:>10.1f}" if peak is not None else f"{'':>10}" if self.trace_memory else ""
+            print(f"{label[:35]:<36}{event['wall_s']:>10.3f}{cpu}{cached}{memory}")
+        rss = peak_rss_bytes()
+        if rss is not None:
+            print(f"Process peak RSS (whole run): {rss / 2**20:.1f} MiB")
+        print("="*50 + "\n")
+
+    def _add(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def _dump_profile(self, profile, name):
+        if not os.path.exists(self.profile_dir):
+            os.makedirs(self.profile_dir)
+        path = os.path.join(self.profile_dir, f"{name}.prof")
+        profile.dump_stats(path)
+        return path
+
+    def _chrome_events(self, events):
+        trace = []
+        for tid, thread_name in TRACE_THREADS.values():
+            trace.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+                          "args": {"name": thread_name}})
+        for event in events:
+            args = dict(event["info"])
+            args.update({k: v for k, v in event.items()
+                         if k not in ("name", "cat", "info", "start_s", "wall_s")})
+            trace.append({
+                "name": event["name"],
+                "cat": event["cat"],
+                "ph": "X",
+                "ts": round(event["start_s"] * 1e6, 3),
+                "dur": round(event["wall_s"] * 1e6, 3),
+                "pid": 1,
+                "tid": TRACE_THREADS[event["cat"]][0],
+                "args": args
+            })
+        return trace
@@ -1,116 +1,69 @@
 import os
-import markdown
+import gzip
+import hashlib
+import html
+import json
 import re
 
+# Matches level 2/3 headers; markdown emits each header on its own line
+HEADER_PATTERN = re.compile(r'<h([23])[^>]*>(.*?)</h\1>', re.IGNORECASE)
+
+# Header keyword -> plots placed after the first header containing it.
+# Earlier keywords win; a plot is only placed once.
+SECTION_PLOTS = {
+    'Sales Trends': ['yearly_trend'],
+    'Regional': ['regional_sales', 'top_models'],
+    'Mobility': ['fuel_trend', 'transmission'],
+    'Fuel': ['fuel_trend', 'transmission'], # Fallback
+    'Drivers': ['price_segments', 'price_vs_sales', 'mileage_vs_price', 'price_distribution',
+                'color_sales', 'correlation_heatmap']
+}
+
 class ReportGenerator:
-    def __init__(self, output_dir='output'):
+    def __init__(self, output_dir='output', plotlyjs='cdn', gzip_output=False):
+        """
+        plotlyjs: 'cdn' loads plotly.js pinned to the installed plotly version from
+        the CDN, 'inline' embeds it so the report works offline.
+        gzip_output: also write a precompressed copy of every report (.html.gz).
+        """
         self.output_dir = output_dir
+        self.plotlyjs = plotlyjs
+        self.gzip_output = gzip_output
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-    def generate_interactive_report(self, narrative_text, plot_htmls):
+    def generate_interactive_report(self, narrative_text, plot_htmls, filename='Interactive_Report.html', slice_label=None):
         """
         Generates an interactive HTML report with Plotly charts embedded.
+        slice_label (e.g. "Region: Asia") is appended to the title of sliced reports.
         """
-        report_path = os.path.join(self.output_dir, 'Interactive_Report.html')
+        report_path = os.path.join(self.output_dir, filename)
+        html_content = self.render_interactive_report(narrative_text, plot_htmls, slice_label)
+
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+
+        if self.gzip_output:
+            # mtime=0 keeps the compressed output reproducible
+            with gzip.GzipFile(report_path + '.gz', 'wb', compresslevel=9, mtime=0) as f:
+                f.write(html_content.encode('utf-8'))
+
+        return report_path
+
+    def render_interactive_report(self, narrative_text, plot_htmls, slice_label=None):
+        """Returns the report HTML without writing it (see generate_interactive_report)."""
+        import markdown
+
+        title_suffix = f" - {html.escape(slice_label)}" if slice_label else ""
         
         # Convert Markdown narrative to HTML
         narrative_html = markdown.markdown(narrative_text, extensions=['extra'])
-        
-        # Define injection points
-        # Map simpler keywords to plot keys
-        injections = [
-            (r'(<h[23]>.*?Sales Trends.*?</h[23]>)', 'yearly_trend'),
-            (r'(<h[23]>.*?Regional.*?Performance.*?</h[23]>)', 'regional_sales'),
-            (r'(<h[23]>.*?Regional.*?Performance.*?</h[23]>)', 'top_models'), # Inject both here? Or split? Let's inject top_models after regional
-            (r'(<h[23]>.*?Mobility Trends.*?</h[23]>)', 'fuel_trend'),
-            (r'(<h[23]>.*?Mobility Trends.*?</h[23]>)', 'transmission'),
-            (r'(<h[23]>.*?Key Drivers.*?</h[23]>)', 'price_vs_sales')
-        ]
-        
-        # We need to handle multiple injections carefully. 
-        # Easier strategy: Split the text by headers?
-        # Or just use replace with a marker?
-        
-        # Let's simple append plots after the matched header. 
-        # Since we might match the same header multiple times (e.g. for Regional and Top Models), 
-        # we should do it sequentially or use specific markers.
-        
-        # Simplified approach: Append the plot DIV after the header tag.
-        
-        for pattern, plot_key in injections:
-            if plot_key in plot_htmls:
-                plot_div = f'<div class="chart-container">{plot_htmls[plot_key]}</div>'
-                # Use sub to insert after the match. count=1 to only do it once per plot per header type logic
-                # But wait, if we have multiple plots for one header, we need to be careful.
-                # Let's just create a combined string of plots if multiple map to one header?
-                # No, the loop runs for each plot.
-                # Regex replace: replace the header with "header + plot".
-                
-                # Check if we already inserted this plot?
-                # No need, we iterate through injections list.
-                
-                # However, if we replace the header, the next injection looking for the same header pattern will find it again?
-                # Yes. So we should probably iterate the narrative once or be careful.
-                
-                # Let's try to just insert them.
-                # But if we modify `narrative_html` in place, the offsets change.
-                # Regex replace is safe regarding offsets if we just replace string content.
-                
-                # Problem: If I replace "<h2>Header</h2>" with "<h2>Header</h2><div>Plot</div>", the next regex finding "<h2>Header</h2>" will match the same thing and insert another plot.
-                # Result: "<h2>Header</h2><div>Plot2</div><div>Plot1</div>". This is actually fine! They will stack.
-                
-                # So I will just loop and replace.
-                # To avoid re-matching the already modified string loop forever, I will trust that standard python re.sub doesn't do recursive replacement in that way unless called repeatedly.
-                
-                # Actually, I should use a unique marker if I want to be precise, but let's try this.
-                # I'll use a specific regex that matches the header tag.
-                
-                # Important: Remove the plot from plot_htmls so we know which ones are used, 
-                # to append unused ones at the end.
-                pass
-
-        # Better logic:
-        # 1. Create a dictionary of Header Key -> List of Plots
-        header_plots = {}
-        unused_plots = set(plot_htmls.keys())
-        
-        keywords = {
-            'Sales Trends': ['yearly_trend'],
-            'Regional': ['regional_sales', 'top_models'],
-            'Mobility': ['fuel_trend', 'transmission'],
-            'Fuel': ['fuel_trend', 'transmission'], # Fallback
-            'Drivers': ['price_segments', 'color_sales', 'correlation_heatmap']
-        }
-        
-        # We iterate through the HTML to find headers, and if they match a keyword, we prepare the injection
-        # But iterating HTML with regex is brittle.
-        # Let's just do a blind search/replace for the headers we expect from the prompt.
-        
-        for key, plot_list in keywords.items():
-            # Find the header in HTML
-            # Case insensitive search for header containing key
-            pattern = re.compile(f'(<h[23][^>]*>.*{key}.*?</h[23]>)', re.IGNORECASE)
-            match = pattern.search(narrative_html)
-            if match:
-                # We found a header. We will append the plots after it.
-                plots_to_insert = []
-                for pk in plot_list:
-                    if pk in unused_plots:
-                        plots_to_insert.append(plot_htmls[pk])
-                        unused_plots.remove(pk)
-                
-                if plots_to_insert:
-                    injection = "\n".join([f'<div class="chart-container">{p}</div>' for p in plots_to_insert])
-                    # Replace the header with Header + Injection
-                    # We use a lambda to ensure we replace the exact match
-                    narrative_html = pattern.sub(lambda m: m.group(1) + injection, narrative_html, count=1)
 
-        # Append remaining unused plots at the end
-        if unused_plots:
-            narrative_html += "<h2>Visual Appendix</h2>"
-            for pk in unused_plots:
-                narrative_html += f'<div class="chart-container">{plot_htmls[pk]}</div>'
+        # Compact plots (figure dicts) become empty divs, drawn from one shared data block
+        figure_script = self._figure_script(plot_htmls)
+        plot_htmls = {key: self._plot_markup(key, plot) for key, plot in plot_htmls.items()}
+        
+        narrative_html = self._inject_plots(narrative_html, plot_htmls)
 
         # Full HTML Template
         html_content = f"""
@@ -119,8 +72,8 @@ class ReportGenerator:
         <head>
             <meta charset="UTF-8">
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>BMW Sales Analysis Report</title>
-            <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+            <title>BMW Sales Analysis Report{title_suffix}</title>
+            {self.plotlyjs_tag()}
             <style>
                 body {{
                     font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
@@ -152,13 +105,159 @@ class ReportGenerator:
             </style>
         </head>
         <body>
-            <h1>BMW Sales Performance Analysis: Executive Report</h1>
+            <h1>BMW Sales Performance Analysis: Executive Report{title_suffix}</h1>
             {narrative_html}
+            {figure_script}
         </body>
         </html>
         """
-        
-        with open(report_path, 'w', encoding='utf-8') as f:
+        return html_content
+
+    def render_plot_page(self, plot_key, plot_html):
+        """A standalone HTML page showing a single plot."""
+        return (
+            "<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<meta charset=\"UTF-8\">\n"
+            f"<title>BMW Sales: {html.escape(plot_key)}</title>\n{self.plotlyjs_tag()}\n</head>\n"
+            f"<body>\n{plot_html}\n</body>\n</html>\n")
+
+    def _inject_plots(self, narrative_html, plot_htmls):
+        """
+        Places each plot after its section header. Headers are indexed in one
+        pass and the document is assembled from a list of parts with a single
+        join, so the cost stays linear in the narrative length.
+        """
+        headers = [(match.end(), match.group(2).lower()) for match in HEADER_PATTERN.finditer(narrative_html)]
+
+        unused_plots = list(plot_htmls)
+        insertions = {} # header end offset -> plot keys
+        for keyword, plot_keys in SECTION_PLOTS.items():
+            keyword = keyword.lower()
+            header_end = next((end for end, text in headers if keyword in text), None)
+            if header_end is None:
+                continue
+            for plot_key in plot_keys:
+                if plot_key in unused_plots:
+                    insertions.setdefault(header_end, []).append(plot_key)
+                    unused_plots.remove(plot_key)
+
+        parts = []
+        position = 0
+        for header_end in sorted(insertions):
+            parts.append(narrative_html[position:header_end])
+            parts.append("\n".join(self._chart(plot_htmls[pk]) for pk in insertions[header_end]))
+            position = header_end
+        parts.append(narrative_html[position:])
+
+        # Append remaining unused plots at the end
+        if unused_plots:
+            parts.append("<h2>Visual Appendix</h2>")
+            parts.extend(self._chart(plot_htmls[pk]) for pk in unused_plots)
+
+        return "".join(parts)
+
+    def _chart(self, plot_html):
+        return f'<div class="chart-container">{plot_html}</div>'
+
+    def plotlyjs_tag(self):
+        from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+        if self.plotlyjs == 'inline':
+            return f'<script type="text/javascript">{get_plotlyjs()}</script>'
+        # Pinned: plotly-latest is frozen at 1.x, which cannot read the typed arrays plotly.py emits
+        return f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>'
+
+    def _plot_markup(self, plot_key, plot):
+        if isinstance(plot, dict):
+            return f'<div id="plot-{plot_key}" class="plotly-graph-div" style="height:100%; width:100%;"></div>'
+        return plot
+
+    def _figure_script(self, plot_htmls):
+        """
+        Serializes every compact figure into a single minified JSON block. Layout
+        templates, which are identical across figures, are stored only once.
+        """
+        templates = {}
+        figures = {}
+        for key, plot in plot_htmls.items():
+            if not isinstance(plot, dict):
+                continue
+            layout = dict(plot.get('layout', {}))
+            figure = {"data": plot.get('data', []), "layout": layout}
+            template = layout.pop('template', None)
+            if template is not None:
+                template_json = json.dumps(template, sort_keys=True, separators=(',', ':'))
+                template_id = hashlib.sha1(template_json.encode('utf-8')).hexdigest()[:12]
+                templates.setdefault(template_id, template)
+                figure["template"] = template_id
+            figures[key] = figure
+
+        if not figures:
+            return ""
+
+        data = json.dumps({"templates": templates, "figures": figures}, separators=(',', ':'))
+        # Keep the JSON from closing the script element early
+        data = data.replace('</', '<\\/')
+        return f"""<script type="application/json" id="report-figures">{data}</script>
+            <script type="text/javascript">
+                (function() {{
+                    var block = JSON.parse(document.getElementById('report-figures').textContent);
+                    Object.keys(block.figures).forEach(function(key) {{
+                        var figure = block.figures[key];
+                        if (figure.template !== undefined) {{
+                            figure.layout.template = block.templates[figure.template];
+                        }}
+                        Plotly.newPlot('plot-' + key, figure.data, figure.layout, {{responsive: true}});
+                    }});
+                }})();
+            </script>"""
+
+    def generate_index(self, reports, filename='index.html'):
+        """
+        Writes an index page linking to sliced reports.
+        reports: list of (group, label, report_path) tuples, listed in order per group.
+        """
+        index_path = os.path.join(self.output_dir, filename)
+
+        groups = {}
+        for group, label, report_path in reports:
+            link = os.path.relpath(report_path, self.output_dir).replace(os.sep, '/')
+            groups.setdefault(group, []).append(
+                f'<li><a href="{html.escape(link, quote=True)}">{html.escape(str(label))}</a></li>')
+
+        sections = "\n".join(
+            f"<h2>{html.escape(group)}</h2>\n<ul>\n" + "\n".join(items) + "\n</ul>"
+            for group, items in groups.items()
+        )
+
+        html_content = f"""
+        <!DOCTYPE html>
+        <html lang="en">
+        <head>
+            <meta charset="UTF-8">
+            <title>BMW Sales Analysis Reports</title>
+            <style>
+                body {{
+                    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                    line-height: 1.6;
+                    color: #333;
+                    max-width: 1000px;
+                    margin: 0 auto;
+                    padding: 40px;
+                    background-color: #f9f9f9;
+                }}
+                h1, h2 {{
+                    color: #003366;
+                }}
+            </style>
+        </head>
+        <body>
+            <h1>BMW Sales Analysis Reports</h1>
+            {sections}
+        </body>
+        </html>
+        """
+
+        with open(index_path, 'w', encoding='utf-8') as f:
             f.write(html_content)
-            
-        return report_path
+
+        return index_path
@@ -0,0 +1,376 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from urllib.parse import unquote, urlsplit
+from src.data_loader import DataLoader
+from src.aggregates import SalesAggregates
+from src.analyzer import BMWAnalyzer
+from src.visualizer import BMWVisualizer, MAX_POINTS, PLOTS
+from src.report_generator import ReportGenerator
+
+# Largest request head (request line + headers) accepted
+MAX_HEADER_BYTES = 64 * 1024
+
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_TIMEOUT = 15
+
+# Bodies at least this large are also kept gzip-compressed
+GZIP_MIN_BYTES = 1024
+
+# Seconds a report with a fallback narrative (LLM unavailable) is served before the LLM is asked again
+FALLBACK_REPORT_TTL = 60
+
+STATUS_TEXT = {
+    200: 'OK',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    500: 'Internal Server Error'
+}
+
+
+class Resource:
+    """An encoded response body with its strong ETag and, if large, a gzip copy."""
+
+    def __init__(self, body, content_type):
+        self.body = body
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.gzipped = gzip.compress(body, mtime=0) if len(body) >= GZIP_MIN_BYTES else None
+
+    @classmethod
+    def json(cls, value):
+        return cls(json.dumps(value, default=str).encode('utf-8'), 'application/json')
+
+    @classmethod
+    def html(cls, text):
+        return cls(text.encode('utf-8'), 'text/html; charset=utf-8')
+
+
+class ReportService:
+    """
+    Keeps the loaded data, aggregates, summary stats and every rendered
+    resource warm in memory. Each resource is built once (concurrent requests
+    wait for the same build), and all of them are dropped when the data file
+    changes on disk. With prewarm, the stats, plots and report are rebuilt in
+    the background right after every (re)load instead of on first request.
+    """
+
+    def __init__(self, data_path, narrate, compact=False, report_options=None, prewarm=True, filters=None,
+                 max_points=MAX_POINTS):
+        """
+        narrate: coroutine function (summary_stats) -> (markdown narrative,
+        fallback); fallback is true when the narrative is not an LLM answer
+        (e.g. a template after a failed call), and the report is then
+        rebuilt after FALLBACK_REPORT_TTL seconds.
+        compact, max_points / report_options: as for BMWVisualizer / ReportGenerator.
+        filters: row filters, as for DataLoader.
+        """
+        self.data_path = data_path
+        self.filters = filters
+        self.narrate = narrate
+        self.compact = compact
+        self.max_points = max_points
+        self.prewarm = prewarm
+        self._warm_task = None
+        self.generator = ReportGenerator(**(report_options or {}))
+        self.state = None
+        self._source_signature = None
+        self._resources = {}
+        self._expires = {}
+        self._locks = {}
+
+    def _signature(self):
+        """mtime and size of the data file, or of every file of a dataset directory."""
+        if not os.path.isdir(self.data_path):
+            stat = os.stat(self.data_path)
+            return (stat.st_mtime_ns, stat.st_size)
+        # Rewriting a partition file leaves the directory mtimes unchanged
+        files = []
+        for root, dirs, names in os.walk(self.data_path):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Removed while walking; the next request sees the new layout
+                    continue
+                files.append((os.path.relpath(path, self.data_path), stat.st_mtime_ns, stat.st_size))
+        return tuple(files)
+
+    def _load(self):
+        df = DataLoader(self.data_path, filters=self.filters).load_data()
+        aggregates = SalesAggregates(df)
+        return {
+            "rows": len(df),
+            "loaded_at": time.time(),
+            "aggregates": aggregates,
+            "summary_stats": BMWAnalyzer(aggregates).get_summary_stats(),
+            "visualizer": BMWVisualizer(aggregates, max_points=self.max_points),
+            "compact_visualizer": BMWVisualizer(aggregates, compact=True, max_points=self.max_points),
+            # (visualizer, plot key) -> rendered plot, shared by plot pages and the report
+            "rendered": {}
+        }
+
+    async def ensure_loaded(self):
+        """Loads the data on first use and again whenever the file changed."""
+        signature = self._signature()
+        if signature == self._source_signature:
+            return
+        async with self._lock('__state__'):
+            if signature == self._source_signature:
+                return
+            loop = asyncio.get_running_loop()
+            self.state = await loop.run_in_executor(None, self._load)
+            self._resources = {}
+            self._expires = {}
+            self._source_signature = signature
+            print(f"Data loaded: {self.state['rows']} rows from {self.data_path}")
+            if self.prewarm:
+                self._warm_task = asyncio.ensure_future(self.warm())
+
+    async def warm(self):
+        """Builds the stats, every plot page and the report ahead of the first request."""
+        names = ['stats'] + [f'plot:{key}' for key in PLOTS] + ['report']
+        for name in names:
+            try:
+                await self.resource(name)
+            except Exception as e:
+                print(f"Warning: could not prebuild {name}: {e}")
+        print("Warm-up complete.")
+
+    def _lock(self, name):
+        return self._locks.setdefault(name, asyncio.Lock())
+
+    async def resource(self, name):
+        """Returns the Resource for name ('stats', 'plot:<key>', 'report', ...), building it once."""
+        await self.ensure_loaded()
+        resource = self._cached(name)
+        if resource is not None:
+            return resource
+        async with self._lock(name):
+            while True:
+                resource = self._cached(name)
+                if resource is not None:
+                    return resource
+                state = self.state
+                resource, ttl = await self._build(name, state)
+                if state is not self.state:
+                    # The data was reloaded during the build: the result is stale, build it again
+                    continue
+                self._resources[name] = resource
+                if ttl is None:
+                    self._expires.pop(name, None)
+                else:
+                    self._expires[name] = time.monotonic() + ttl
+                return resource
+
+    def _cached(self, name):
+        expires = self._expires.get(name)
+        if expires is not None and time.monotonic() >= expires:
+            return None
+        return self._resources.get(name)
+
+    async def _build(self, name, state):
+        """
+        Returns (resource, seconds it stays valid or None until the data
+        changes), built entirely from state (one loaded version of the data).
+        """
+        loop = asyncio.get_running_loop()
+        kind, _, key = name.partition(':')
+        if kind == 'stats':
+            return Resource.json(state['summary_stats']), None
+        if kind == 'plots':
+            return Resource.json(list(PLOTS)), None
+        if kind == 'plot':
+            return await loop.run_in_executor(None, self._plot_page, state, key), None
+        if kind == 'figure':
+            figure = await loop.run_in_executor(None, self._render, state, 'compact_visualizer', key)
+            return Resource(json.dumps(figure, separators=(',', ':')).encode('utf-8'), 'application/json'), None
+        if kind == 'report':
+            narrative, fallback = await self.narrate(state['summary_stats'])
+            page = await loop.run_in_executor(None, self._report_page, state, narrative)
+            return page, FALLBACK_REPORT_TTL if fallback else None
+        raise KeyError(name)
+
+    def _render(self, state, visualizer, key):
+        rendered = state['rendered']
+        if (visualizer, key) not in rendered:
+            rendered[(visualizer, key)] = getattr(state[visualizer], PLOTS[key])()
+        return rendered[(visualizer, key)]
+
+    def _plot_page(self, state, key):
+        return Resource.html(self.generator.render_plot_page(key, self._render(state, 'visualizer', key)))
+
+    def _report_page(self, state, narrative):
+        visualizer = 'compact_visualizer' if self.compact else 'visualizer'
+        plots = {key: self._render(state, visualizer, key) for key in PLOTS}
+        return Resource.html(self.generator.render_interactive_report(narrative, plots))
+
+    def health(self):
+        return Resource.json({
+            "status": "ok",
+            "rows": self.state['rows'] if self.state else None,
+            "loaded_at": self.state['loaded_at'] if self.state else None,
+            "cached_resources": sorted(self._resources)
+        })
+
+
+class ReportServer:
+    """
+    Minimal HTTP/1.1 server on asyncio streams (GET/HEAD, keep-alive) in
+    front of a ReportService. Responses carry strong ETags; a matching
+    If-None-Match gets 304 Not Modified, and large bodies are sent gzipped
+    to clients that accept it.
+
+    Endpoints:
+        /health              service status
+        /stats               BMWAnalyzer.get_summary_stats() as JSON
+        /plots               available plot keys
+        /plots/<key>         one plot as a standalone HTML page
+        /plots/<key>.json    one plot as a compact Plotly figure
+        /report              the full interactive report
+    """
+
+    def __init__(self, service, host='127.0.0.1', port=8000, access_log=True):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.access_log = access_log
+
+    def route(self, path):
+        """Maps a request path to a resource name, or None."""
+        path = unquote(path).rstrip('/') or '/'
+        if path == '/stats':
+            return 'stats'
+        if path == '/plots':
+            return 'plots'
+        if path == '/report':
+            return 'report'
+        if path.startswith('/plots/'):
+            key = path[len('/plots/'):]
+            if key.endswith('.json') and key[:-5] in PLOTS:
+                return f'figure:{key[:-5]}'
+            if key in PLOTS:
+                return f'plot:{key}'
+        return None
+
+    async def serve_forever(self):
+        # Load before accepting connections, so the first request is already warm
+        await self.service.ensure_loaded()
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port, limit=MAX_HEADER_BYTES)
+        print(f"Serving BMW sales reports on http://{self.host}:{self.port}/ (Ctrl+C to stop)")
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    writer.write(self._response(400, Resource.json({"error": "Request head too large"}), {}, False))
+                    break
+
+                start = time.perf_counter()
+                request = self._parse_head(head)
+                if request is None:
+                    writer.write(self._response(400, Resource.json({"error": "Malformed request"}), {}, False))
+                    break
+                method, target, version, headers = request
+
+                # Bodies are not used by any endpoint; discard them to keep the connection in sync
+                try:
+                    length = int(headers.get('content-length', '0') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    writer.write(self._response(400, Resource.json({"error": "Invalid Content-Length"}), {}, False))
+                    break
+                if length:
+                    await reader.readexactly(length)
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+                status, resource = await self._dispatch(method, target)
+                response = self._response(status, resource, headers, keep_alive, head_only=method == 'HEAD')
+                writer.write(response)
+                await writer.drain()
+
+                if self.access_log:
+                    elapsed = (time.perf_counter() - start) * 1000
+                    print(f"{method} {target} {int(response.split(b' ', 2)[1])} {elapsed:.1f} ms")
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse_head(head):
+        lines = head.decode('latin-1').split('\r\n')
+        parts = lines[0].split(' ')
+        if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+            return None
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        return parts[0].upper(), parts[1], parts[2], headers
+
+    async def _dispatch(self, method, target):
+        if method not in ('GET', 'HEAD'):
+            return 405, Resource.json({"error": f"Method {method} not allowed"})
+
+        path = urlsplit(target).path
+        if path == '/health':
+            return 200, self.service.health()
+        if path in ('', '/'):
+            return 200, Resource.json({"endpoints": ["/health", "/stats", "/plots", "/plots/<key>",
+                                                    "/plots/<key>.json", "/report"]})
+        name = self.route(path)
+        if name is None:
+            return 404, Resource.json({"error": f"Not found: {path}"})
+        try:
+            return 200, await self.service.resource(name)
+        except Exception as e:
+            print(f"Error building {name}: {e}")
+            return 500, Resource.json({"error": str(e)})
+
+    @staticmethod
+    def _response(status, resource, request_headers, keep_alive, head_only=False):
+        headers = {
+            "Content-Type": resource.content_type,
+            # Clients may keep copies but must revalidate them (cheap with the ETag)
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive" if keep_alive else "close"
+        }
+        body = resource.body
+        if status == 200:
+            headers["ETag"] = resource.etag
+            if_none_match = request_headers.get('if-none-match')
+            if if_none_match and (if_none_match.strip() == '*' or
+                                  resource.etag in [tag.strip() for tag in if_none_match.split(',')]):
+                status, body = 304, b''
+                del headers["Content-Type"]
+            elif resource.gzipped is not None:
+                headers["Vary"] = "Accept-Encoding"
+                if 'gzip' in request_headers.get('accept-encoding', ''):
+                    headers["Content-Encoding"] = "gzip"
+                    body = resource.gzipped
+
+        headers["Content-Length"] = str(len(body))
+        head = f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        head += "\r\n"
+        return head.encode('latin-1') + (b'' if head_only else body)
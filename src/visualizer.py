@@ -1,105 +1,414 @@
+import base64
+import functools
+import hashlib
+import math
+import time
+import tracemalloc
+from contextlib import nullcontext
+import numpy as np
+import pandas as pd
+import plotly
 import plotly.express as px
 import plotly.graph_objects as go
-import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import src.aggregates
+from src.aggregates import POINT_SAMPLE_SIZE, ensure_aggregates
+from src.profiler import traced_peak
+
+# Report plot keys and the BMWVisualizer methods that render them, in report order
+PLOTS = {
+    'yearly_trend': 'plot_yearly_trend',
+    'regional_sales': 'plot_regional_sales',
+    'top_models': 'plot_top_models',
+    'correlation_heatmap': 'plot_correlation_heatmap',
+    'fuel_trend': 'plot_fuel_trend',
+    'transmission': 'plot_transmission',
+    'price_segments': 'plot_price_segments',
+    'color_sales': 'plot_color_sales',
+    'price_vs_sales': 'plot_price_vs_sales',
+    'mileage_vs_price': 'plot_mileage_vs_price',
+    'price_distribution': 'plot_price_distribution'
+}
+
+# Aggregate views each plot is drawn from. A cached plot is reused while the
+# digest of its views (plus the figure parameters, the plotly version and the
+# code in PLOT_CODE_FILES) is unchanged.
+PLOT_INPUTS = {
+    'yearly_trend': lambda a: [a.sales_by('Year')],
+    'regional_sales': lambda a: [a.sales_by('Region')],
+    'top_models': lambda a: [a.sales_by('Model')],
+    'correlation_heatmap': lambda a: [a.correlation_matrix()],
+    'fuel_trend': lambda a: [a.sales_by_pair('Year', 'Fuel_Type')],
+    'transmission': lambda a: [a.sales_by('Transmission')],
+    'price_segments': lambda a: [a.sales_by('Price_Segment')],
+    'color_sales': lambda a: [a.sales_by('Color')],
+    'price_vs_sales': lambda a: _point_inputs(a, 'Price_USD', 'Sales_Volume'),
+    'mileage_vs_price': lambda a: _point_inputs(a, 'Mileage_KM', 'Price_USD'),
+    'price_distribution': lambda a: _point_inputs(a, 'Fuel_Type', 'Price_USD')
+}
+
+# Source files whose code shapes the cached figures: this module, and the
+# aggregates whose binning and sampling build the plot inputs
+PLOT_CODE_FILES = [__file__, src.aggregates.__file__]
+
+# Row-level plots draw every point up to this many rows; larger data is drawn
+# as a density grid of all rows with a sample of max_points on top. At most
+# POINT_SAMPLE_SIZE, the number of rows the aggregates keep for these plots.
+MAX_POINTS = 2000
+
+# Density grid resolution limit per axis, so the grid size stays bounded
+MAX_GRID_BINS = 100
+
+
+# Integer typed-array dtypes understood by plotly.js, narrowest first
+TYPED_ARRAY_INTS = ['i1', 'u1', 'i2', 'u2', 'i4', 'u4']
+
+
+def _round_significant(values, digits):
+    """Rounds an array of floats to the given number of significant digits."""
+    values = np.array(values, dtype='float64')
+    nonzero = np.isfinite(values) & (values != 0)
+    magnitude = np.floor(np.log10(np.abs(values[nonzero])))
+    scale = 10.0 ** (digits - 1 - magnitude)
+    values[nonzero] = np.round(values[nonzero] * scale) / scale
+    return values
+
+
+def _narrow_array(values):
+    """
+    Converts an integer-valued numeric array to the narrowest integer dtype
+    plotly.js reads as a typed array; other arrays are returned unchanged.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        if not (values.size and np.isfinite(values).all() and (values == np.round(values)).all()):
+            return values
+        values = values.astype('int64')
+    if values.dtype.kind in 'iu':
+        low, high = (values.min(), values.max()) if values.size else (0, 0)
+        for candidate in TYPED_ARRAY_INTS:
+            info = np.iinfo(candidate)
+            if info.min <= low and high <= info.max:
+                return values.astype(candidate)
+    return values
+
+
+def _encode_array(values, float_digits):
+    """Encodes a numeric array as a plotly.js typed array ({dtype, bdata[, shape]})."""
+    values = np.asarray(values)
+    if values.dtype.kind not in 'iuf':
+        return _compact_value(values.tolist(), float_digits)
+
+    values = _narrow_array(values)
+    if values.dtype.kind == 'f':
+        values = _round_significant(values, float_digits)
+
+    # int64 beyond the 32-bit range has no typed array; it goes as float64
+    dtype = values.dtype.str[1:] if values.dtype.str[1:] in TYPED_ARRAY_INTS else 'f8'
+
+    encoded = {
+        "dtype": dtype,
+        "bdata": base64.b64encode(values.astype(dtype).tobytes()).decode('ascii')
+    }
+    if values.ndim > 1:
+        encoded["shape"] = ", ".join(str(n) for n in values.shape)
+    return encoded
+
+
+def _compact_value(value, float_digits):
+    """Recursively narrows arrays and rounds floats in a plotly JSON structure."""
+    if isinstance(value, dict):
+        if 'dtype' in value and 'bdata' in value:
+            # Typed array already encoded by plotly.py; re-encode it narrower
+            decoded = np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+            if 'shape' in value:
+                decoded = decoded.reshape([int(n) for n in str(value['shape']).split(',')])
+            return _encode_array(decoded, float_digits)
+        return {k: _compact_value(v, float_digits) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_compact_value(v, float_digits) for v in value]
+    if isinstance(value, np.ndarray):
+        return _encode_array(value, float_digits)
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isfinite(value) and value != 0:
+        return float(f"{value:.{float_digits}g}")
+    return value
+
+
+def compact_figure(fig, float_digits=6):
+    """
+    Plotly figure -> minimal JSON-ready dict ({data, layout}) with floats rounded
+    to float_digits significant digits and numeric arrays as narrow typed arrays.
+    """
+    return _compact_value(fig.to_plotly_json(), float_digits)
+
+
+def _point_inputs(aggregates, x, y):
+    if (x, y) not in aggregates.point_grids:
+        return [x, y]
+    bins, counts = aggregates.point_grids[(x, y)]
+    sample = [aggregates.point_sample([col]) for col in (x, y) if col in aggregates.numeric_columns]
+    labels = [aggregates.labels[col] for col in (x, y) if col in aggregates.labels]
+    return [aggregates.row_count, bins, counts] + sample + labels
+
+
+def _update_digest(sha256, value):
+    """Feeds a plot input (pandas object, array or plain value) into a hash."""
+    if isinstance(value, (pd.Series, pd.DataFrame, pd.Index)):
+        # Index labels and values are hashed row by row; names and dtypes here
+        dtypes = value.dtypes if isinstance(value, pd.DataFrame) else [value.dtype]
+        sha256.update(repr((type(value).__name__, list(getattr(value, 'columns', [])),
+                            [str(dtype) for dtype in dtypes])).encode('utf-8'))
+        value = pd.util.hash_pandas_object(value).to_numpy()
+    if isinstance(value, np.ndarray):
+        sha256.update(f"{value.dtype}{value.shape}".encode('utf-8'))
+        sha256.update(np.ascontiguousarray(value).tobytes())
+    else:
+        sha256.update(repr(value).encode('utf-8'))
+
+
+@functools.lru_cache(maxsize=None)
+def _code_digest():
+    """Hash of the PLOT_CODE_FILES sources, so changed plot code never reuses old figures."""
+    sha256 = hashlib.sha256()
+    for path in PLOT_CODE_FILES:
+        with open(path, 'rb') as f:
+            sha256.update(f.read())
+    return sha256.hexdigest()
+
+
+def _render_plot(visualizer, plot_key, trace_memory=False):
+    """
+    Module-level so it can be pickled into process pool workers.
+    Returns (plot output, timing) with the wall and thread CPU time of the render
+    and, with trace_memory, its tracemalloc peak.
+    """
+    with (traced_peak() if trace_memory else nullcontext()) as memory:
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        output = getattr(visualizer, PLOTS[plot_key])()
+        timing = {
+            "start": start,
+            "wall_s": time.perf_counter() - start,
+            "cpu_s": time.thread_time() - cpu_start,
+            "output_chars": len(output) if isinstance(output, str) else None
+        }
+    if memory is not None:
+        timing["tracemalloc_peak_bytes"] = memory["bytes"]
+    return output, timing
+
 
 class BMWVisualizer:
-    def __init__(self, df):
-        self.df = df
+    def __init__(self, data, compact=False, float_digits=6, max_points=MAX_POINTS, cache=None):
+        """
+        data: a DataFrame or the SalesAggregates already built for BMWAnalyzer.
+        compact: plots are returned as compact figure dicts (see compact_figure)
+        for ReportGenerator to embed in one shared data block, instead of HTML.
+        max_points: most points drawn by a scatter plot, 1 to POINT_SAMPLE_SIZE
+        (see MAX_POINTS).
+        cache: optional DiskCache; generate_all_plots then only renders the
+        plots whose inputs changed (see PLOT_INPUTS).
+        """
+        if not 1 <= max_points <= POINT_SAMPLE_SIZE:
+            raise ValueError(f"max_points must be between 1 and {POINT_SAMPLE_SIZE}, got {max_points}")
+        self.aggregates = ensure_aggregates(data)
+        self.compact = compact
+        self.float_digits = float_digits
+        self.max_points = max_points
+        self.cache = cache
+        self.plot_timings = {}
+
+    def cache_key(self, plot_key):
+        """Content hash of a plot's inputs, the figure parameters and the plotly version."""
+        sha256 = hashlib.sha256()
+        for part in (plot_key, self.compact, self.float_digits, self.max_points, plotly.__version__,
+                     _code_digest()):
+            _update_digest(sha256, part)
+        for value in PLOT_INPUTS[plot_key](self.aggregates):
+            _update_digest(sha256, value)
+        return sha256.hexdigest()
 
     def get_plotly_html(self, fig):
         """Converts a plotly figure to an HTML div string."""
         return fig.to_html(full_html=False, include_plotlyjs=False)
 
+    def render(self, fig):
+        """Serializes a figure in the configured output format."""
+        if self.compact:
+            return compact_figure(fig, self.float_digits)
+        return self.get_plotly_html(fig)
+
     def plot_yearly_trend(self):
-        yearly_sales = self.df.groupby('Year')['Sales_Volume'].sum().reset_index()
-        fig = px.line(yearly_sales, x='Year', y='Sales_Volume', 
+        yearly_sales = self.aggregates.sales_by('Year').reset_index()
+        fig = px.line(yearly_sales, x='Year', y='Sales_Volume',
                       title='Global Sales Trend (2020-2024)',
                       markers=True)
         fig.update_layout(xaxis_title='Year', yaxis_title='Sales Volume')
-        return self.get_plotly_html(fig)
+        return self.render(fig)
 
     def plot_regional_sales(self):
-        regional_sales = self.df.groupby('Region')['Sales_Volume'].sum().sort_values(ascending=False).reset_index()
-        fig = px.bar(regional_sales, x='Sales_Volume', y='Region', 
+        regional_sales = self.aggregates.sales_by('Region').sort_values(ascending=False).reset_index()
+        fig = px.bar(regional_sales, x='Sales_Volume', y='Region',
                      title='Total Sales by Region',
-                     orientation='h', 
+                     orientation='h',
                      color='Sales_Volume',
                      color_continuous_scale='Viridis')
         fig.update_layout(xaxis_title='Sales Volume', yaxis_title='Region', yaxis={'categoryorder':'total ascending'})
-        return self.get_plotly_html(fig)
+        return self.render(fig)
 
     def plot_top_models(self):
-        top_models = self.df.groupby('Model')['Sales_Volume'].sum().sort_values(ascending=False).head(10).reset_index()
-        fig = px.bar(top_models, x='Sales_Volume', y='Model', 
+        top_models = self.aggregates.sales_by('Model').sort_values(ascending=False).head(10).reset_index()
+        fig = px.bar(top_models, x='Sales_Volume', y='Model',
                      title='Top 10 Performing Models',
                      orientation='h',
                      color='Sales_Volume',
                      color_continuous_scale='Magma')
         fig.update_layout(xaxis_title='Sales Volume', yaxis_title='Model', yaxis={'categoryorder':'total ascending'})
-        return self.get_plotly_html(fig)
-    
+        return self.render(fig)
+
     def plot_correlation_heatmap(self):
         """Generates a correlation heatmap for numerical variables."""
-        numeric_cols = ['Engine_Size_L', 'Mileage_KM', 'Price_USD', 'Sales_Volume']
-        # Filter for existing columns
-        cols_to_use = [col for col in numeric_cols if col in self.df.columns]
-        
-        if len(cols_to_use) < 2:
+        if len(self.aggregates.numeric_columns) < 2:
             return "<div>Not enough numerical data for correlation analysis.</div>"
 
-        corr_matrix = self.df[cols_to_use].corr()
-        
-        fig = px.imshow(corr_matrix, 
+        corr_matrix = self.aggregates.correlation_matrix()
+
+        fig = px.imshow(corr_matrix,
                         text_auto=True,
                         aspect="auto",
                         color_continuous_scale='RdBu_r',
                         title='Correlation Heatmap: Key Drivers')
-        return self.get_plotly_html(fig)
+        return self.render(fig)
 
     def plot_fuel_trend(self):
-        fuel_trend = self.df.pivot_table(index='Year', columns='Fuel_Type', values='Sales_Volume', aggfunc='sum').fillna(0).reset_index()
+        fuel_trend = self.aggregates.sales_by_pair('Year', 'Fuel_Type').reset_index()
         # Melt for plotly express
         fuel_melt = fuel_trend.melt(id_vars='Year', var_name='Fuel Type', value_name='Sales Volume')
         fig = px.area(fuel_melt, x='Year', y='Sales Volume', color='Fuel Type',
                       title='Evolution of Fuel Type Preferences')
-        return self.get_plotly_html(fig)
+        return self.render(fig)
 
     def plot_transmission(self):
-        trans_sales = self.df.groupby('Transmission')['Sales_Volume'].sum().reset_index()
-        fig = px.pie(trans_sales, values='Sales_Volume', names='Transmission', 
+        trans_sales = self.aggregates.sales_by('Transmission').reset_index()
+        fig = px.pie(trans_sales, values='Sales_Volume', names='Transmission',
                      title='Transmission Distribution',
                      hole=0.4)
-        return self.get_plotly_html(fig)
+        return self.render(fig)
 
     def plot_price_segments(self):
-        bins = [0, 40000, 70000, 100000, float('inf')]
-        labels = ['Budget (<40k)', 'Mid-Range (40k-70k)', 'Premium (70k-100k)', 'Luxury (>100k)']
-        df_copy = self.df.copy()
-        df_copy['Price_Segment'] = pd.cut(df_copy['Price_USD'], bins=bins, labels=labels)
-        segment_sales = df_copy.groupby('Price_Segment')['Sales_Volume'].sum().reset_index()
-        
+        segment_sales = self.aggregates.sales_by('Price_Segment').reset_index()
+
         fig = px.bar(segment_sales, x='Price_Segment', y='Sales_Volume',
                      title='Sales Volume by Price Segment',
                      color='Sales_Volume',
                      color_continuous_scale='Blues')
-        return self.get_plotly_html(fig)
+        return self.render(fig)
 
     def plot_color_sales(self):
-        color_sales = self.df.groupby('Color')['Sales_Volume'].sum().sort_values(ascending=False).head(10).reset_index()
+        color_sales = self.aggregates.sales_by('Color').sort_values(ascending=False).head(10).reset_index()
         fig = px.bar(color_sales, x='Color', y='Sales_Volume',
                      title='Sales Volume by Color',
                      color='Sales_Volume',
                      color_continuous_scale='Turbo')
-        return self.get_plotly_html(fig)
+        return self.render(fig)
+
+    def plot_price_vs_sales(self):
+        return self._density_scatter('Price_USD', 'Sales_Volume', 'Price vs Sales Volume per Listing',
+                                     'Price (USD)', 'Sales Volume')
+
+    def plot_mileage_vs_price(self):
+        return self._density_scatter('Mileage_KM', 'Price_USD', 'Mileage vs Price per Listing',
+                                     'Mileage (km)', 'Price (USD)')
+
+    def _density_scatter(self, x, y, title, x_title, y_title):
+        """
+        Scatter plot of one point per row, drawn with WebGL. Above max_points
+        rows, the rows are drawn as a heatmap of the pre-binned counts of all
+        rows, overlaid with a uniform sample of max_points rows, so the
+        figure size does not grow with the data.
+        """
+        if (x, y) not in self.aggregates.point_grids:
+            return f"<div>No {x} and {y} data for a scatter plot.</div>"
+
+        points = self.aggregates.point_sample([x, y]).dropna()
+        fig = go.Figure()
+        if self.aggregates.row_count > self.max_points:
+            grid = self.aggregates.binned_counts(x, y, max_bins=MAX_GRID_BINS)
+            counts = grid.pivot(index=y, columns=x, values='count')
+            # Empty cells are 0, which keeps the grid an integer typed array (NaN would need float64)
+            fig.add_trace(go.Heatmap(x=_narrow_array(counts.columns), y=_narrow_array(counts.index),
+                                     z=_narrow_array(counts.fillna(0).to_numpy()), colorscale='Blues',
+                                     name='All rows', colorbar={'title': 'Rows'}))
+            points = points.head(self.max_points)
+            name = f'Sample of {len(points):,} of {self.aggregates.row_count:,} rows'
+        else:
+            name = 'Rows'
+        fig.add_trace(go.Scattergl(x=_narrow_array(points[x]), y=_narrow_array(points[y]), mode='markers', name=name,
+                                   marker={'size': 3, 'opacity': 0.4, 'color': '#003366'}))
+        fig.update_layout(title=title, xaxis_title=x_title, yaxis_title=y_title,
+                          legend={'orientation': 'h', 'y': -0.2})
+        return self.render(fig)
+
+    def plot_price_distribution(self):
+        """Price histogram per fuel type, from the pre-binned counts of all rows."""
+        if ('Fuel_Type', 'Price_USD') not in self.aggregates.point_grids:
+            return "<div>No Fuel_Type and Price_USD data for a price distribution.</div>"
+
+        grid = self.aggregates.binned_counts('Fuel_Type', 'Price_USD', max_bins=MAX_GRID_BINS)
+        width = grid.attrs['bin_widths']['Price_USD']
+        for column in ('Price_USD', 'count'):
+            grid[column] = _narrow_array(grid[column])
+        fig = px.bar(grid, x='Price_USD', y='count', color='Fuel_Type', barmode='overlay', opacity=0.6,
+                     title='Price Distribution by Fuel Type')
+        fig.update_traces(width=width)
+        fig.update_layout(xaxis_title='Price (USD)', yaxis_title='Listings', bargap=0)
+        return self.render(fig)
+
+    def generate_all_plots(self, workers=1, use_processes=False):
+        """
+        Builds and serializes every plot, returning {plot_key: html}
+        ({plot_key: figure dict} in compact mode).
+        With a cache, plots whose cache key is stored are reused and only the
+        others are rendered (and then stored).
+        With workers > 1 the figures are rendered concurrently on a thread pool,
+        or on a process pool when use_processes is set (faster for large figures,
+        since to_html serialization holds the GIL).
+        Per-plot timings of the last call are kept in self.plot_timings, with
+        the tracemalloc peak of each plot when tracemalloc is tracing and the
+        plots are rendered serially.
+        """
+        rendered = {}
+        cache_keys = {}
+        if self.cache is not None:
+            for key in PLOTS:
+                start = time.perf_counter()
+                cpu_start = time.thread_time()
+                cache_keys[key] = self.cache_key(key)
+                output = self.cache.get(cache_keys[key])
+                if output is not None:
+                    rendered[key] = output, {
+                        "start": start,
+                        "wall_s": time.perf_counter() - start,
+                        "cpu_s": time.thread_time() - cpu_start,
+                        "output_chars": len(output) if isinstance(output, str) else None,
+                        "cached": True
+                    }
+
+        missing = [key for key in PLOTS if key not in rendered]
+        if not workers or workers <= 1 or len(missing) <= 1:
+            # tracemalloc's peak is process-wide, so only serial renders get a peak each
+            trace_memory = tracemalloc.is_tracing()
+            rendered.update({key: _render_plot(self, key, trace_memory) for key in missing})
+        else:
+            executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+            with executor_class(max_workers=min(workers, len(missing))) as executor:
+                futures = {key: executor.submit(_render_plot, self, key) for key in missing}
+                rendered.update({key: future.result() for key, future in futures.items()})
+
+        if self.cache is not None:
+            for key in missing:
+                self.cache.set(cache_keys[key], rendered[key][0])
 
-    def generate_all_plots(self):
-        plots = {}
-        plots['yearly_trend'] = self.plot_yearly_trend()
-        plots['regional_sales'] = self.plot_regional_sales()
-        plots['top_models'] = self.plot_top_models()
-        plots['correlation_heatmap'] = self.plot_correlation_heatmap()
-        plots['fuel_trend'] = self.plot_fuel_trend()
-        plots['transmission'] = self.plot_transmission()
-        plots['price_segments'] = self.plot_price_segments()
-        plots['color_sales'] = self.plot_color_sales()
-        return plots
+        self.plot_timings = {key: rendered[key][1] for key in PLOTS}
+        return {key: rendered[key][0] for key in PLOTS}
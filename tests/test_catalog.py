@@ -0,0 +1,29 @@
+import pandas as pd
+
+from benchmarks.synthetic_data import generate_sales_data
+from src.catalog import write_partitioned
+from src.data_loader import DataLoader, DATASET_DTYPES
+
+
+def test_chunks_with_different_value_ranges_share_one_schema(tmp_path):
+    df = generate_sales_data(2000)
+    df['Sales_Volume'] = 100
+    df.loc[1500, 'Sales_Volume'] = 40000
+    source = tmp_path / 'sales.csv'
+    df.to_csv(source, index=False)
+
+    # The first chunk downcasts Sales_Volume to int8, the second one to int32
+    loader = DataLoader(str(source), use_cache=False)
+    chunks = list(loader.iter_chunks(1000))
+    assert chunks[0]['Sales_Volume'].dtype != chunks[1]['Sales_Volume'].dtype
+
+    for file_format in ('parquet', 'csv'):
+        directory = str(tmp_path / file_format)
+        rows = write_partitioned(iter(chunks), directory, file_format, dtypes=DATASET_DTYPES)
+        assert rows == len(df)
+
+        loaded = DataLoader(directory).load_data()
+        assert len(loaded) == len(df)
+        assert loaded['Sales_Volume'].sum() == df['Sales_Volume'].sum()
+        streamed = pd.concat(DataLoader(directory).iter_chunks(700))
+        assert streamed['Sales_Volume'].max() == 40000